@@ -0,0 +1,201 @@
+from storage_layout import breed_collection, breed_filter
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+import os
+import threading
+import time
+
+DOGS_AGE_INDEX_TTL_SECONDS = float(os.getenv("DOGS_AGE_INDEX_TTL_SECONDS", "300"))
+DOGS_AGE_INDEX_MAX_SIZE = int(os.getenv("DOGS_AGE_INDEX_MAX_SIZE", "1024"))
+
+class AgeBuckets:
+    """
+    The age buckets of one (breed, gender), sorted by age.
+
+    create_dog_data rejects overlapping age ranges, so the buckets are disjoint and
+    both from_age and to_age are sorted, which lets every query binary search on to_age.
+    Data that breaks the invariant (e.g. inserted by hand) falls back to a linear scan.
+    """
+
+    def __init__(self, dog_data_items):
+        self.items = sorted(dog_data_items, key=lambda dog_data: (dog_data['from_age'], dog_data['to_age']))
+        self.to_ages = [dog_data['to_age'] for dog_data in self.items]
+        self.disjoint = all(self.items[i]['to_age'] <= self.items[i + 1]['from_age'] for i in range(len(self.items) - 1))
+        self.loaded_at = time.monotonic()
+
+    def find_containing(self, age):
+        """
+        Find the first bucket with from_age <= age <= to_age
+        """
+        if not self.disjoint:
+            return next((dog_data for dog_data in self.items if dog_data['from_age'] <= age <= dog_data['to_age']), None)
+        index = bisect_left(self.to_ages, age)
+        if index < len(self.items) and self.items[index]['from_age'] <= age:
+            return self.items[index]
+        return None
+
+    def find_exact(self, from_age, to_age):
+        """
+        Find the bucket with exactly this age range
+        """
+        if not self.disjoint:
+            return next((dog_data for dog_data in self.items if dog_data['from_age'] == from_age and dog_data['to_age'] == to_age), None)
+        # A zero-width bucket shares its to_age with the bucket touching it from below
+        for index in range(bisect_left(self.to_ages, to_age), bisect_right(self.to_ages, to_age)):
+            if self.items[index]['from_age'] == from_age:
+                return self.items[index]
+        return None
+
+    def find_overlapping(self, from_age, to_age):
+        """
+        Find a bucket with from_age < to_age and to_age > from_age (touching ranges do not overlap)
+        """
+        if not self.disjoint:
+            return next((dog_data for dog_data in self.items if dog_data['from_age'] < to_age and dog_data['to_age'] > from_age), None)
+        index = bisect_right(self.to_ages, from_age)
+        if index < len(self.items) and self.items[index]['from_age'] < to_age:
+            return self.items[index]
+        return None
+
+class AgeIntervalIndex:
+    """
+    In-memory age buckets per (breed, gender), loaded from MongoDB on first use and
+    kept current by the write paths. Buckets are reloaded after DOGS_AGE_INDEX_TTL_SECONDS
+    to pick up writes made by other processes.
+
+    The keys come from the requests, so at most max_size (breed, gender) are kept: the least
+    recently used ones are evicted, and expired ones are dropped when they are read.
+    """
+
+    def __init__(self, ttl_seconds=DOGS_AGE_INDEX_TTL_SECONDS, max_size=DOGS_AGE_INDEX_MAX_SIZE):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.__buckets = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, breed_name, gender):
+        """
+        Get the loaded age buckets of a (breed, gender)
+
+        :return: The age buckets, or None if they are not loaded or expired
+        :rtype: AgeBuckets
+        """
+        key = (breed_name, gender)
+        with self.__lock:
+            buckets = self.__buckets.get(key)
+            if buckets is None:
+                return None
+            if buckets.loaded_at + self.ttl_seconds <= time.monotonic():
+                del self.__buckets[key]
+                return None
+            self.__buckets.move_to_end(key)
+            return buckets
+
+    def load(self, breed_name, gender, dog_data_items):
+        """
+        Replace the age buckets of a (breed, gender)
+
+        :return: The loaded age buckets
+        :rtype: AgeBuckets
+        """
+        buckets = AgeBuckets(dog_data_items)
+        if self.max_size <= 0:
+            return buckets
+        with self.__lock:
+            self.__buckets[(breed_name, gender)] = buckets
+            self.__buckets.move_to_end((breed_name, gender))
+            while len(self.__buckets) > self.max_size:
+                self.__buckets.popitem(last=False)
+        return buckets
+
+    def add(self, dog_data):
+        """
+        Add or replace a dog data item in its loaded (breed, gender) buckets
+        """
+        self.__update(dog_data['breed_name'], dog_data['gender'], lambda items: [item for item in items if item['_id'] != dog_data['_id']] + [dog_data])
+
+    def remove(self, dog_data):
+        """
+        Remove a dog data item from its loaded (breed, gender) buckets
+        """
+        self.__update(dog_data['breed_name'], dog_data['gender'], lambda items: [item for item in items if item['_id'] != dog_data['_id']])
+
+    def invalidate(self, breed_name, gender):
+        """
+        Drop the loaded buckets of a (breed, gender), they are reloaded on next use
+        """
+        with self.__lock:
+            self.__buckets.pop((breed_name, gender), None)
+
+    def invalidate_breed(self, breed_name):
+        """
+        Drop the loaded buckets of every gender of a breed
+        """
+        with self.__lock:
+            for key in [key for key in self.__buckets if key[0] == breed_name]:
+                del self.__buckets[key]
+
+    def clear(self):
+        """
+        Drop every loaded bucket
+        """
+        with self.__lock:
+            self.__buckets.clear()
+
+    def size(self):
+        """
+        Get the number of loaded (breed, gender)
+
+        :rtype: int
+        """
+        with self.__lock:
+            return len(self.__buckets)
+
+    def __update(self, breed_name, gender, change):
+        # Buckets that are not loaded yet will be read from MongoDB on next use
+        with self.__lock:
+            buckets = self.__buckets.get((breed_name, gender))
+            if buckets is not None:
+                updated_buckets = AgeBuckets(change(buckets.items))
+                # Keep the original expiry so other processes' writes are still picked up
+                updated_buckets.loaded_at = buckets.loaded_at
+                self.__buckets[(breed_name, gender)] = updated_buckets
+
+# Age buckets used to resolve ages and detect overlaps without querying MongoDB
+age_interval_index = AgeIntervalIndex()
+
+def load_age_buckets(db, breed_name, gender):
+    """
+    Get the age buckets of a (breed, gender), loading them from MongoDB on a miss
+
+    :param db: MongoDB database
+    :param breed_name: The name of the breed
+    :param gender: The gender of the dog
+    :rtype: AgeBuckets
+    """
+    buckets = age_interval_index.get(breed_name, gender)
+    if buckets is None:
+        dog_data_items = breed_collection(db, breed_name).find(breed_filter(breed_name, {"gender": gender}))
+        buckets = age_interval_index.load(breed_name, gender, list(dog_data_items))
+    return buckets
+
+def load_breed_age_buckets(db, breed_name, genders):
+    """
+    Get the age buckets of several genders of a breed, loading the missing ones from
+    MongoDB with a single query
+
+    :param db: MongoDB database
+    :param breed_name: The name of the breed
+    :param genders: The genders of the dog
+    :return: Dictionary of gender to age buckets
+    :rtype: dict
+    """
+    buckets_by_gender = {gender: age_interval_index.get(breed_name, gender) for gender in genders}
+    missing_genders = [gender for gender, buckets in buckets_by_gender.items() if buckets is None]
+    if missing_genders:
+        dog_data_items = {gender: [] for gender in missing_genders}
+        for dog_data in breed_collection(db, breed_name).find(breed_filter(breed_name, {"gender": {"$in": missing_genders}})):
+            dog_data_items[dog_data['gender']].append(dog_data)
+        for gender in missing_genders:
+            buckets_by_gender[gender] = age_interval_index.load(breed_name, gender, dog_data_items[gender])
+    return buckets_by_gender
@@ -1,14 +1,13 @@
 from flask import Flask
 from flasgger import Swagger
-from mongodb_connection_manager import MongoConnectionHolder
 from routes import initial_routes
 import os
 
 app = Flask(__name__)
 Swagger(app)
 
-# Initialize Database Connection
-MongoConnectionHolder.initialize_db()
+# The database connection is created lazily by each process on first use, so the app
+# can be preloaded before forking workers without sharing a MongoClient across them
 
 # Import the routes
 initial_routes(app)
@@ -0,0 +1,53 @@
+from quart import Quart
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.exceptions import HTTPException
+from mongodb_connection_manager import AsyncMongoConnectionHolder
+from storage_backend import DOGS_STORAGE_BACKEND, MONGODB_BACKEND
+from controllers.dogs_async_server import dogs_async_blueprint
+from app import app as wsgi_app
+
+# Asynchronous deployment mode, served by an ASGI server, e.g.:
+#   hypercorn asgi_app:app --workers 4
+# The read endpoints run on the event loop with the async MongoDB driver, the other
+# endpoints (writes, Swagger UI) and every endpoint of the other storage backends are
+# served by the Flask app in a thread.
+async_app = Quart(__name__, static_folder=None)
+async_app.register_blueprint(dogs_async_blueprint)
+
+@async_app.before_serving
+async def connect_db():
+    # Create the clients before the first request, only the MongoDB backend is served here
+    if DOGS_STORAGE_BACKEND == MONGODB_BACKEND:
+        await AsyncMongoConnectionHolder.connect()
+
+@async_app.after_serving
+async def close_db():
+    await AsyncMongoConnectionHolder.close()
+
+wsgi_fallback = WsgiToAsgi(wsgi_app)
+async_routes = async_app.url_map.bind("")
+
+def serves_async(scope):
+    """
+    Check whether a request is served by the async app
+
+    :param scope: The ASGI connection scope
+    :rtype: bool
+    """
+    if scope["type"] != "http":
+        # Lifespan events start and stop the async app
+        return True
+    if DOGS_STORAGE_BACKEND != MONGODB_BACKEND:
+        # The async endpoints read MongoDB directly, other backends are served by the Flask app
+        return False
+    try:
+        async_routes.match(scope["path"], method=scope["method"])
+        return True
+    except HTTPException:
+        return False
+
+async def app(scope, receive, send):
+    if serves_async(scope):
+        await async_app(scope, receive, send)
+    else:
+        await wsgi_fallback(scope, receive, send)
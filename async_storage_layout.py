@@ -0,0 +1,177 @@
+from storage_layout import STORAGE_LAYOUT, DOGS_DATA_COLLECTION, BREED_SUMMARY_COLLECTION, PAGE_SORT_KEYS, DOGS_ID_LOCATOR_FALLBACK_SCAN, is_single_collection, breed_collection, breed_filter, keyset_filter, cached_breed_names, catalogue_breed_names
+from dogs_id_locator import DogIdLocator, ID_LOCATOR_COLLECTION
+from age_intervals import age_interval_index
+import asyncio
+
+# Async counterparts of the storage_layout reads, used by the ASGI app. Queries that
+# span several breed collections run concurrently instead of one collection at a time.
+
+async def list_breed_names(db, layout=STORAGE_LAYOUT):
+    """
+    List the names of the stored breeds, served from the breed catalogue for the configured layout
+
+    :param db: Async MongoDB database
+    :param layout: The storage layout
+    :return: The breed names
+    :rtype: list
+    """
+    breed_names = cached_breed_names(layout)
+    if breed_names is not None:
+        return breed_names
+    if is_single_collection(layout):
+        return catalogue_breed_names(await db[DOGS_DATA_COLLECTION].distinct("breed_name"), layout)
+    return catalogue_breed_names(await db.list_collection_names(), layout)
+
+async def find_all(db, projection=None, layout=STORAGE_LAYOUT):
+    """
+    Get every stored dog data item, reading the breed collections concurrently
+
+    :param db: Async MongoDB database
+    :param projection: The fields to return, None for all of them
+    :param layout: The storage layout
+    :return: The dog data documents, grouped by breed
+    :rtype: list
+    """
+    if is_single_collection(layout):
+        return await db[DOGS_DATA_COLLECTION].find({}, projection).to_list(None)
+
+    breed_names = await list_breed_names(db, layout)
+    dogs_data_by_breed = await asyncio.gather(*(db[breed].find({}, projection).to_list(None) for breed in breed_names))
+    return [dog_data for dogs_data in dogs_data_by_breed for dog_data in dogs_data]
+
+async def find_page(db, after=None, limit=0, projection=None, batch_size=0, layout=STORAGE_LAYOUT):
+    """
+    Iterate over the dog data items in (breed_name, gender, from_age, _id) order
+
+    :param db: Async MongoDB database
+    :param after: The PAGE_SORT_KEYS values of the last item of the previous page, None to start from the beginning
+    :param limit: The maximum number of items, 0 for no limit
+    :param projection: The fields to return, must include PAGE_SORT_KEYS for the next page to be computable
+    :param batch_size: The cursor batch size, 0 for the server default
+    :param layout: The storage layout
+    :return: Async generator of dog data documents
+    """
+    if is_single_collection(layout):
+        query = keyset_filter(PAGE_SORT_KEYS, after) if after else {}
+        async for dog_data in db[DOGS_DATA_COLLECTION].find(query, projection, sort=[(key, 1) for key in PAGE_SORT_KEYS], limit=limit, batch_size=batch_size):
+            yield dog_data
+        return
+
+    # A page is read in key order, so the breed collections are read one after the other
+    breed_sort_keys = PAGE_SORT_KEYS[1:]
+    remaining = limit
+    for breed in await list_breed_names(db, layout):
+        if after and breed < after[0]:
+            continue
+        query = keyset_filter(breed_sort_keys, after[1:]) if after and breed == after[0] else {}
+        async for dog_data in db[breed].find(query, projection, sort=[(key, 1) for key in breed_sort_keys], limit=remaining, batch_size=batch_size):
+            yield dog_data
+            if limit:
+                remaining -= 1
+                if remaining == 0:
+                    return
+
+async def find_by_id(db, dog_id, layout=STORAGE_LAYOUT):
+    """
+    Find a dog data item by its UUID, resolving its breed collection through the ID locator
+
+    :param db: Async MongoDB database
+    :param dog_id: The UUID of the dog data
+    :param layout: The storage layout
+    :return: The dog data, or None if not found
+    :rtype: dict
+    """
+    if is_single_collection(layout):
+        return await db[DOGS_DATA_COLLECTION].find_one({"_id": dog_id})
+
+    # The in-process mapping is shared with the synchronous app, which backfills the locator
+    breed = DogIdLocator.cached(dog_id)
+    if breed is None:
+        entry = await db[ID_LOCATOR_COLLECTION].find_one({"_id": dog_id})
+        if entry is None:
+            return await scan_for_id(db, dog_id, layout) if DOGS_ID_LOCATOR_FALLBACK_SCAN else None
+        breed = entry["breed_name"]
+        DogIdLocator.remember(dog_id, breed)
+    dog_data = await db[breed].find_one({"_id": dog_id})
+    if dog_data is None:
+        # The locator entry is stale (e.g. the record was deleted by another worker)
+        await db[ID_LOCATOR_COLLECTION].delete_one({"_id": dog_id})
+        DogIdLocator.remember(dog_id, None)
+    return dog_data
+
+async def scan_for_id(db, dog_id, layout=STORAGE_LAYOUT):
+    """
+    Find a dog data item missing from the ID locator by querying every breed collection
+    concurrently, stopping at the first hit, and register it in the locator
+
+    :param db: Async MongoDB database
+    :param dog_id: The UUID of the dog data
+    :param layout: The storage layout
+    :return: The dog data, or None if not found
+    :rtype: dict
+    """
+    async def find_in_breed(breed):
+        return breed, await db[breed].find_one({"_id": dog_id})
+
+    tasks = [asyncio.ensure_future(find_in_breed(breed)) for breed in await list_breed_names(db, layout)]
+    try:
+        for task in asyncio.as_completed(tasks):
+            breed, dog_data = await task
+            if dog_data is not None:
+                await db[ID_LOCATOR_COLLECTION].replace_one({"_id": dog_id}, DogIdLocator.entry(dog_id, breed), upsert=True)
+                DogIdLocator.remember(dog_id, breed)
+                return dog_data
+        return None
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def load_breed_age_buckets(db, breed_name, genders):
+    """
+    Get the age buckets of several genders of a breed, loading the missing ones from
+    MongoDB with a single query
+
+    :param db: Async MongoDB database
+    :param breed_name: The name of the breed
+    :param genders: The genders of the dog
+    :return: Dictionary of gender to age buckets
+    :rtype: dict
+    """
+    buckets_by_gender = {gender: age_interval_index.get(breed_name, gender) for gender in genders}
+    missing_genders = [gender for gender, buckets in buckets_by_gender.items() if buckets is None]
+    if missing_genders:
+        dog_data_items = {gender: [] for gender in missing_genders}
+        async for dog_data in breed_collection(db, breed_name).find(breed_filter(breed_name, {"gender": {"$in": missing_genders}})):
+            dog_data_items[dog_data['gender']].append(dog_data)
+        for gender in missing_genders:
+            buckets_by_gender[gender] = age_interval_index.load(breed_name, gender, dog_data_items[gender])
+    return buckets_by_gender
+
+async def load_age_buckets(db, breed_name, gender):
+    """
+    Get the age buckets of a (breed, gender), loading them from MongoDB on a miss
+
+    :param db: Async MongoDB database
+    :param breed_name: The name of the breed
+    :param gender: The gender of the dog
+    :rtype: AgeBuckets
+    """
+    return (await load_breed_age_buckets(db, breed_name, [gender]))[gender]
+
+async def list_breed_pictures(db, layout=STORAGE_LAYOUT):
+    """
+    List every breed with the picture URL of its first dog data item, from the breed
+    summary collection when it is built, reading the breed collections concurrently otherwise
+
+    :param db: Async MongoDB database
+    :param layout: The storage layout
+    :return: List of {"breed_name", "pic_url"} items sorted by breed name
+    :rtype: list
+    """
+    summary = await db[BREED_SUMMARY_COLLECTION].find({}, sort=[("_id", 1)]).to_list(None)
+    if summary:
+        return [{"breed_name": entry["_id"], "pic_url": entry["pic_url"]} for entry in summary]
+
+    breed_names = await list_breed_names(db, layout)
+    dogs_data = await asyncio.gather(*(breed_collection(db, breed, layout).find_one(breed_filter(breed, {}, layout), {"pic_url": 1}) for breed in breed_names))
+    return [{"breed_name": breed, "pic_url": dog_data.get("pic_url")} for breed, dog_data in zip(breed_names, dogs_data) if dog_data]
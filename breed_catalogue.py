@@ -0,0 +1,72 @@
+import os
+import threading
+import time
+
+DOGS_BREED_CATALOGUE_TTL_SECONDS = float(os.getenv("DOGS_BREED_CATALOGUE_TTL_SECONDS", "60"))
+
+class BreedCatalogue:
+    """
+    Cached list of the stored breeds, so enumerating breeds does not issue a
+    listCollections (or distinct) command on every request.
+
+    The list is reloaded after ttl_seconds, and updated eagerly when this process
+    adds a breed or drops breeds.
+    """
+
+    def __init__(self, ttl_seconds=DOGS_BREED_CATALOGUE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.__breed_names = None
+        self.__loaded_at = 0.0
+        self.__lock = threading.Lock()
+
+    def get(self):
+        """
+        Get the cached breed names
+
+        :return: The sorted breed names, or None if they must be (re)loaded
+        :rtype: list
+        """
+        with self.__lock:
+            if self.__breed_names is None or self.__loaded_at + self.ttl_seconds <= time.monotonic():
+                return None
+            return list(self.__breed_names)
+
+    def set(self, breed_names):
+        """
+        Replace the cached breed names
+
+        :param breed_names: The breed names loaded from the database
+        """
+        with self.__lock:
+            self.__breed_names = sorted(breed_names)
+            self.__loaded_at = time.monotonic()
+
+    def add(self, breed_name):
+        """
+        Add a breed to the cached breed names, if they are loaded
+
+        :param breed_name: The name of the new breed
+        """
+        with self.__lock:
+            if self.__breed_names is not None and breed_name not in self.__breed_names:
+                self.__breed_names = sorted(self.__breed_names + [breed_name])
+
+    def remove(self, breed_name):
+        """
+        Remove a breed from the cached breed names, if they are loaded
+
+        :param breed_name: The name of the dropped breed
+        """
+        with self.__lock:
+            if self.__breed_names is not None and breed_name in self.__breed_names:
+                self.__breed_names = [name for name in self.__breed_names if name != breed_name]
+
+    def invalidate(self):
+        """
+        Drop the cached breed names, they are reloaded on next use
+        """
+        with self.__lock:
+            self.__breed_names = None
+
+# Breeds of the configured storage layout
+breed_catalogue = BreedCatalogue()
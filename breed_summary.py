@@ -0,0 +1,80 @@
+from storage_layout import BREED_SUMMARY_COLLECTION, find_breed_picture, find_breed_pictures
+
+class BreedSummary:
+    """
+    Materialized breed -> picture URL summary serving /dogs_data/BreedsAndUrl with a
+    single read of the summary collection, whatever the number of breeds.
+
+    The summary is built from the breed data when it is empty and refreshed by the
+    write paths for the breeds they touch.
+    """
+    __ready = False
+
+    @staticmethod
+    def list(db):
+        """
+        List every breed with the picture URL of its first dog data item
+
+        :param db: MongoDB database
+        :return: List of {"breed_name", "pic_url"} items sorted by breed name
+        :rtype: list
+        """
+        summary = list(db[BREED_SUMMARY_COLLECTION].find({}, sort=[("_id", 1)]))
+        if not summary and not BreedSummary.__ready:
+            BreedSummary.rebuild(db)
+            summary = list(db[BREED_SUMMARY_COLLECTION].find({}, sort=[("_id", 1)]))
+        BreedSummary.__ready = True
+        return [{"breed_name": entry["_id"], "pic_url": entry["pic_url"]} for entry in summary]
+
+    @staticmethod
+    def rebuild(db):
+        """
+        Rebuild the summary from the breed data
+
+        :param db: MongoDB database
+        :return: The number of summarized breeds
+        :rtype: int
+        """
+        pictures = find_breed_pictures(db)
+        summary = db[BREED_SUMMARY_COLLECTION]
+        summary.delete_many({"_id": {"$nin": list(pictures)}})
+        for breed_name, pic_url in pictures.items():
+            summary.replace_one({"_id": breed_name}, {"_id": breed_name, "pic_url": pic_url}, upsert=True)
+        return len(pictures)
+
+    @staticmethod
+    def record_created(db, dog_data):
+        """
+        Add the breed of a new dog data item to the summary if it is not there yet
+
+        :param db: MongoDB database
+        :param dog_data: The inserted dog data
+        """
+        db[BREED_SUMMARY_COLLECTION].update_one(
+            {"_id": dog_data["breed_name"]},
+            {"$setOnInsert": {"pic_url": dog_data["pic_url"]}},
+            upsert=True
+        )
+
+    @staticmethod
+    def refresh(db, breed_name):
+        """
+        Recompute the summary entry of a breed after its dog data was updated or deleted
+
+        :param db: MongoDB database
+        :param breed_name: The name of the breed
+        """
+        pic_url = find_breed_picture(db, breed_name)
+        if pic_url is None:
+            db[BREED_SUMMARY_COLLECTION].delete_one({"_id": breed_name})
+        else:
+            db[BREED_SUMMARY_COLLECTION].replace_one({"_id": breed_name}, {"_id": breed_name, "pic_url": pic_url}, upsert=True)
+
+    @staticmethod
+    def clear(db):
+        """
+        Remove every entry from the summary
+
+        :param db: MongoDB database
+        """
+        db[BREED_SUMMARY_COLLECTION].delete_many({})
@@ -0,0 +1,348 @@
+from dogs_cache import breed_lookup_cache
+from age_intervals import age_interval_index
+from breed_catalogue import breed_catalogue
+from conditional_requests import data_versions
+from storage_layout import STORAGE_LAYOUT, DOGS_DATA_COLLECTION, INTERNAL_COLLECTIONS, CHANGE_STREAM_CHECKPOINT_COLLECTION, is_single_collection, forget_breed_indexes
+from pymongo.errors import OperationFailure, PyMongoError
+from datetime import datetime
+import os
+import socket
+import threading
+import time
+
+# Every process only sees its own writes, the caches pick up other writes when their TTL expires
+NO_CHANGE_FEED = "none"
+# The writes of every process are read from a MongoDB change stream (needs a replica set, e.g. Atlas)
+CHANGE_STREAM_FEED = "change_stream"
+# The writes are published in this process with local_change_feed, a stand-in for tests
+LOCAL_CHANGE_FEED = "local"
+CHANGE_FEEDS = [NO_CHANGE_FEED, CHANGE_STREAM_FEED, LOCAL_CHANGE_FEED]
+
+DOGS_CACHE_CHANGE_FEED = os.getenv("DOGS_CACHE_CHANGE_FEED", NO_CHANGE_FEED)
+if DOGS_CACHE_CHANGE_FEED not in CHANGE_FEEDS:
+    raise ValueError(f"DOGS_CACHE_CHANGE_FEED must be one of {CHANGE_FEEDS}, got '{DOGS_CACHE_CHANGE_FEED}'")
+
+# Name under which the resume token is checkpointed, the processes of a host share it
+DOGS_CHANGE_STREAM_CONSUMER = os.getenv("DOGS_CHANGE_STREAM_CONSUMER", socket.gethostname())
+# How often the resume token is checkpointed, at most
+DOGS_CHANGE_STREAM_CHECKPOINT_SECONDS = float(os.getenv("DOGS_CHANGE_STREAM_CHECKPOINT_SECONDS", "5"))
+# Delay before watching again after the change stream failed
+DOGS_CHANGE_STREAM_RETRY_SECONDS = float(os.getenv("DOGS_CHANGE_STREAM_RETRY_SECONDS", "5"))
+
+# Error codes of a resume token the server can no longer resume from (ChangeStreamHistoryLost,
+# ChangeStreamFatalError, InvalidResumeToken): the events since the checkpoint are lost
+LOST_RESUME_TOKEN_CODES = {286, 280, 260}
+
+# Operations invalidating a whole breed collection in the per-breed layout
+COLLECTION_OPERATIONS = {"drop", "rename"}
+
+def change_event(change, layout=STORAGE_LAYOUT):
+    """
+    Convert a change stream event to a cache invalidation event
+
+    :param change: The change stream event
+    :param layout: The storage layout
+    :return: {"operation", "breed_name", "gender", "from_age", "to_age"} with only the fields
+             that are known, a missing breed_name invalidates every breed. None when the change
+             does not affect dog data.
+    :rtype: dict
+    """
+    operation = change.get("operationType")
+    collection = change.get("ns", {}).get("coll")
+    if collection is None:
+        # dropDatabase and invalidate events
+        return {"operation": operation}
+
+    if is_single_collection(layout):
+        if collection != DOGS_DATA_COLLECTION:
+            return None
+        # Deleted documents are only known by their _id, their breed is unknown
+        dog_data = change.get("fullDocument") or {}
+    else:
+        if collection in INTERNAL_COLLECTIONS:
+            return None
+        # The collection is the breed, updates and deletes do not carry the document
+        dog_data = {**(change.get("fullDocument") or {}), "breed_name": collection}
+
+    event = {"operation": operation}
+    for field in ["breed_name", "gender", "from_age", "to_age"]:
+        if dog_data.get(field) is not None:
+            event[field] = dog_data[field]
+    return event
+
+class LocalChangeFeed:
+    """
+    In-process stand-in for the change stream: every published invalidation event is
+    delivered to the subscribers right away, e.g. to test the cache invalidation without
+    a replica set.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__subscribers = []
+
+    def subscribe(self, callback):
+        """
+        Deliver the published events to a callback
+
+        :param callback: Callable taking an invalidation event
+        """
+        with self.__lock:
+            if callback not in self.__subscribers:
+                self.__subscribers.append(callback)
+
+    def publish(self, event):
+        """
+        Deliver an invalidation event to every subscriber
+
+        :param event: The invalidation event, see change_event
+        """
+        with self.__lock:
+            subscribers = list(self.__subscribers)
+        for callback in subscribers:
+            callback(event)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+class ChangeStreamFeed(LocalChangeFeed):
+    """
+    Invalidation events read from a MongoDB change stream by a background thread.
+
+    The resume token is checkpointed in CHANGE_STREAM_CHECKPOINT_COLLECTION, so a restarted
+    process resumes after the last checkpoint instead of missing the writes made meanwhile.
+    When there is nothing to resume from (first start, or the checkpoint is older than the
+    oplog) every cache is invalidated, as any write may have been missed.
+    """
+
+    def __init__(self, db, consumer=DOGS_CHANGE_STREAM_CONSUMER, checkpoint_seconds=DOGS_CHANGE_STREAM_CHECKPOINT_SECONDS,
+                 retry_seconds=DOGS_CHANGE_STREAM_RETRY_SECONDS, layout=STORAGE_LAYOUT):
+        super().__init__()
+        self.db = db
+        self.consumer = consumer
+        self.checkpoint_seconds = checkpoint_seconds
+        self.retry_seconds = retry_seconds
+        self.layout = layout
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    def start(self):
+        if self.__thread is None:
+            self.__thread = threading.Thread(target=self.__run, name="mongodb-change-stream", daemon=True)
+            self.__thread.start()
+
+    def stop(self):
+        self.__stop.set()
+
+    def watch(self, resume_token):
+        """
+        Open the change stream of the dog data
+
+        :param resume_token: The token to resume after, None to start from now
+        :rtype: ChangeStream
+        """
+        if is_single_collection(self.layout):
+            # Updates carry the document, so only its breed and age range are invalidated
+            return self.db[DOGS_DATA_COLLECTION].watch(full_document="updateLookup", resume_after=resume_token, max_await_time_ms=1000)
+        # Every breed collection, without the writes to the internal collections
+        pipeline = [{"$match": {"ns.coll": {"$nin": sorted(INTERNAL_COLLECTIONS)}}}]
+        return self.db.watch(pipeline, resume_after=resume_token, max_await_time_ms=1000)
+
+    def load_checkpoint(self):
+        """
+        Get the checkpointed resume token of this consumer
+
+        :return: The resume token, or None if there is none
+        """
+        checkpoint = self.db[CHANGE_STREAM_CHECKPOINT_COLLECTION].find_one({"_id": self.consumer})
+        return checkpoint.get("resume_token") if checkpoint else None
+
+    def save_checkpoint(self, resume_token):
+        """
+        Checkpoint the resume token of this consumer
+
+        :param resume_token: The resume token, None to start from now on the next start
+        """
+        self.db[CHANGE_STREAM_CHECKPOINT_COLLECTION].update_one(
+            {"_id": self.consumer},
+            {"$set": {"resume_token": resume_token, "updated_at": datetime.now()}},
+            upsert=True
+        )
+
+    def __run(self):
+        try:
+            resume_token = self.load_checkpoint()
+        except PyMongoError as e:
+            print(f"Failed to load the change stream checkpoint: {e}")
+            resume_token = None
+        checkpointed_token = resume_token
+
+        while not self.__stop.is_set():
+            try:
+                with self.watch(resume_token) as stream:
+                    if resume_token is None:
+                        self.publish({"operation": "invalidate"})
+                    print(f"Watching the dog data changes from process {os.getpid()}")
+                    checkpointed_at = time.monotonic()
+                    while not self.__stop.is_set() and stream.alive:
+                        change = stream.try_next()
+                        if change is not None:
+                            event = change_event(change, self.layout)
+                            if event is not None:
+                                self.publish(event)
+                        # The token moves on without events too, so idle checkpoints stay in the oplog
+                        resume_token = stream.resume_token
+                        if change is not None and change.get("operationType") == "invalidate":
+                            # An invalidated stream cannot be resumed, watch again from now
+                            resume_token = None
+                            break
+                        if resume_token is not None and resume_token != checkpointed_token and checkpointed_at + self.checkpoint_seconds <= time.monotonic():
+                            self.save_checkpoint(resume_token)
+                            checkpointed_token = resume_token
+                            checkpointed_at = time.monotonic()
+                if resume_token is not None and not self.__stop.is_set():
+                    # The server closed the stream, resume it after a pause
+                    self.__stop.wait(self.retry_seconds)
+            except OperationFailure as e:
+                if e.code in LOST_RESUME_TOKEN_CODES:
+                    print(f"Cannot resume the change stream, invalidating every cache: {e}")
+                    resume_token = None
+                    continue
+                print(f"Failed to watch the dog data changes: {e}")
+                self.__stop.wait(self.retry_seconds)
+            except PyMongoError as e:
+                print(f"The change stream failed, resuming: {e}")
+                self.__stop.wait(self.retry_seconds)
+            except Exception as e:
+                print(e)
+                self.__stop.wait(self.retry_seconds)
+
+class CacheInvalidator:
+    """
+    Applies the invalidation events of a change feed to the caches of this process: the
+    lookup cache, the age buckets, the breed catalogue and the response versions (ETags).
+
+    A write to a known age range drops only what it may have changed; writes whose document
+    is unknown (updates and deletes in the per-breed layout) drop the whole breed, and events
+    without a breed (a dropped database, a lost resume token) drop everything. The writes of
+    this process come back through the feed too, which only reloads what they already updated.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the change feed, e.g. in a forked child process where its thread is gone
+        """
+        self.__lock = threading.Lock()
+        self.__feed = None
+        self.__counters = {"events": 0, "range_invalidations": 0, "breed_invalidations": 0, "full_invalidations": 0}
+
+    def start(self, feed):
+        """
+        Subscribe to a change feed and start it, once per process
+
+        :param feed: The change feed, e.g. a ChangeStreamFeed or local_change_feed
+        """
+        if self.__feed is not None:
+            return
+        with self.__lock:
+            if self.__feed is not None:
+                return
+            self.__feed = feed
+        feed.subscribe(self.apply)
+        feed.start()
+
+    def stop(self):
+        """
+        Stop the change feed
+        """
+        with self.__lock:
+            feed = self.__feed
+            self.__feed = None
+        if feed is not None:
+            feed.stop()
+
+    def apply(self, event):
+        """
+        Invalidate the cached data affected by a write
+
+        :param event: The invalidation event, see change_event
+        """
+        if event is None:
+            return
+        operation = event.get("operation")
+        breed_name = event.get("breed_name")
+        if breed_name is None:
+            breed_lookup_cache.clear()
+            age_interval_index.clear()
+            breed_catalogue.invalidate()
+            forget_breed_indexes()
+            data_versions.bump()
+            self.__count("full_invalidations")
+            return
+
+        if operation == "insert":
+            breed_catalogue.add(breed_name)
+        elif operation in COLLECTION_OPERATIONS:
+            breed_catalogue.remove(breed_name)
+            forget_breed_indexes(breed_name)
+        elif operation == "delete":
+            # The breed is gone if this was its last dog data item
+            breed_catalogue.invalidate()
+
+        if all(field in event for field in ["gender", "from_age", "to_age"]):
+            breed_lookup_cache.invalidate_range(breed_name, event["gender"], event["from_age"], event["to_age"])
+            age_interval_index.invalidate(breed_name, event["gender"])
+            self.__count("range_invalidations")
+        else:
+            breed_lookup_cache.invalidate_breed(breed_name)
+            age_interval_index.invalidate_breed(breed_name)
+            self.__count("breed_invalidations")
+        data_versions.bump(breed_name)
+
+    def stats(self):
+        """
+        Get the invalidation counters
+
+        :rtype: dict
+        """
+        with self.__lock:
+            return {**self.__counters, "change_feed": DOGS_CACHE_CHANGE_FEED, "running": self.__feed is not None}
+
+    def __count(self, counter):
+        with self.__lock:
+            self.__counters["events"] += 1
+            self.__counters[counter] += 1
+
+# Stand-in change feed of DOGS_CACHE_CHANGE_FEED=local, publish events to it to invalidate the caches
+local_change_feed = LocalChangeFeed()
+
+# Invalidates the caches of this process on the writes of every process
+cache_invalidator = CacheInvalidator()
+
+def start_cache_invalidation(db=None):
+    """
+    Start the configured change feed of this process, if any. The local feed does not
+    need a database, so it also starts with the other storage backends.
+
+    :param db: MongoDB database, None when it is not connected (yet)
+    """
+    if DOGS_CACHE_CHANGE_FEED == CHANGE_STREAM_FEED and db is not None:
+        cache_invalidator.start(ChangeStreamFeed(db))
+    elif DOGS_CACHE_CHANGE_FEED == LOCAL_CHANGE_FEED:
+        cache_invalidator.start(local_change_feed)
+
+def publish_change(event):
+    """
+    Publish a write of this process to the local change feed when it is the configured
+    feed. The change stream reads the writes back from MongoDB instead.
+
+    :param event: The invalidation event, see change_event
+    """
+    if DOGS_CACHE_CHANGE_FEED == LOCAL_CHANGE_FEED:
+        local_change_feed.publish(event)
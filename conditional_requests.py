@@ -0,0 +1,219 @@
+from flask import request, make_response
+from werkzeug.http import parse_date
+from collections import OrderedDict
+from functools import wraps
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+DOGS_ETAG_CACHE_MAX_SIZE = int(os.getenv("DOGS_ETAG_CACHE_MAX_SIZE", "4096"))
+DOGS_ETAG_CACHE_TTL_SECONDS = float(os.getenv("DOGS_ETAG_CACHE_TTL_SECONDS", "30"))
+
+class DataVersions:
+    """
+    Version counters of the dog data written by this process: one global counter and
+    one counter per breed. A random boot ID is part of every version so versions from
+    a previous run of the process never match.
+    """
+
+    def __init__(self):
+        self.__boot_id = uuid.uuid4().hex[:8]
+        self.__lock = threading.Lock()
+        self.__global_version = 0
+        # Bumped when every breed changes at once, e.g. when all dog data is deleted
+        self.__epoch = 0
+        self.__breeds = {}
+
+    def version(self, breed_name=None):
+        """
+        Get the current version of a breed, or of all the dog data
+
+        :param breed_name: The name of the breed, None for all the dog data
+        :rtype: str
+        """
+        with self.__lock:
+            if breed_name is None:
+                return f"{self.__boot_id}.{self.__global_version}"
+            return f"{self.__boot_id}.{self.__epoch}.{self.__breeds.get(breed_name, 0)}"
+
+    def bump(self, breed_name=None):
+        """
+        Record a write to a breed, or to every breed
+
+        :param breed_name: The name of the written breed, None if every breed changed
+        """
+        with self.__lock:
+            self.__global_version += 1
+            if breed_name is None:
+                self.__epoch += 1
+                self.__breeds.clear()
+            else:
+                self.__breeds[breed_name] = self.__breeds.get(breed_name, 0) + 1
+
+class ResponseVersions:
+    """
+    Bounded cache of the validators last sent for each URL and the data version they
+    were computed at, so a matching conditional request is answered without running
+    the view. Entries expire after ttl_seconds to bound staleness from other processes.
+    """
+
+    def __init__(self, max_size=DOGS_ETAG_CACHE_MAX_SIZE, ttl_seconds=DOGS_ETAG_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, url, version):
+        """
+        Get the validators of a URL if they are still valid at the given data version
+
+        :return: (etag, last_modified), or None
+        :rtype: tuple
+        """
+        with self.__lock:
+            entry = self.__entries.get(url)
+            if entry is None:
+                return None
+            etag, last_modified, entry_version, expires_at = entry
+            if entry_version != version or expires_at <= time.monotonic():
+                del self.__entries[url]
+                return None
+            self.__entries.move_to_end(url)
+            return etag, last_modified
+
+    def put(self, url, version, etag, last_modified):
+        """
+        Remember the validators sent for a URL at the given data version
+        """
+        if self.max_size <= 0:
+            return
+        with self.__lock:
+            self.__entries[url] = (etag, last_modified, version, time.monotonic() + self.ttl_seconds)
+            self.__entries.move_to_end(url)
+            while len(self.__entries) > self.max_size:
+                self.__entries.popitem(last=False)
+
+# Versions of the dog data, bumped by every write endpoint
+data_versions = DataVersions()
+# Validators of the GET responses
+response_versions = ResponseVersions()
+
+def is_not_modified(request, etag, last_modified):
+    """
+    Check whether the request's validators match the current representation
+
+    :param request: The Flask or Quart request
+    :param etag: The ETag of the representation
+    :param last_modified: Its Last-Modified, None if it has none
+    """
+    if request.if_none_match:
+        return request.if_none_match.contains(etag) or request.if_none_match.star_tag
+    if request.if_modified_since is not None and last_modified is not None:
+        return last_modified <= request.if_modified_since
+    return False
+
+def set_validators(response, etag, last_modified):
+    """
+    Add the validators to a Flask or Quart response
+
+    :param response: The response
+    :param etag: The ETag of the representation
+    :param last_modified: Its Last-Modified, None if it has none
+    """
+    response.set_etag(etag)
+    # Assigning None would send the current time
+    if last_modified is not None:
+        response.last_modified = last_modified
+
+def cached_validators(request, breed_name):
+    """
+    Look up the validators last sent for the requested URL, if the data they were computed
+    at is unchanged and they match the request, so the view does not need to run
+
+    :param request: The Flask or Quart request
+    :param breed_name: The breed the response depends on, None if it depends on all the dog data
+    :return: (url, data version, (etag, last_modified) to answer 304 with, or None)
+    :rtype: tuple
+    """
+    version = data_versions.version(breed_name)
+    url = request.full_path
+    validators = response_versions.get(url, version)
+    if validators is not None and not is_not_modified(request, *validators):
+        validators = None
+    return url, version, validators
+
+def body_last_modified(body):
+    """
+    Get the Last-Modified of a response body: the record's updated_at for a single dog data
+    item. Lists have none, the writes of other processes would not move it, so they are
+    only validated by their ETag.
+
+    :param body: The serialized JSON body
+    :rtype: datetime
+    """
+    # Only single records are objects, lists are not parsed
+    if not body.lstrip().startswith(b"{"):
+        return None
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return None
+    if isinstance(data, dict) and isinstance(data.get("updated_at"), str):
+        return parse_date(data["updated_at"])
+    return None
+
+def remember_validators(url, version, body):
+    """
+    Compute the validators of a response body and remember them for the URL
+
+    :param url: The requested URL
+    :param version: The data version the body was built at
+    :param body: The serialized body
+    :return: (etag, last_modified)
+    :rtype: tuple
+    """
+    # Strong ETag over the serialized body, it changes with any field including updated_at
+    etag = hashlib.sha256(body).hexdigest()[:32]
+    last_modified = body_last_modified(body)
+    response_versions.put(url, version, etag, last_modified)
+    return etag, last_modified
+
+def not_modified_response(etag, last_modified):
+    """
+    Build an empty 304 Flask response carrying the validators
+    """
+    response = make_response("", 304)
+    set_validators(response, etag, last_modified)
+    return response
+
+def conditional_get(breed_scope=None):
+    """
+    Add ETag (and for single records Last-Modified) validators to a GET view and answer
+    If-None-Match / If-Modified-Since with 304. While the data version of the view's scope
+    is unchanged, a matching request gets its 304 without running the view (and querying
+    the database).
+
+    :param breed_scope: Name of the view argument holding the breed the response depends on,
+                        None if the response depends on all the dog data
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            url, version, validators = cached_validators(request, kwargs.get(breed_scope) if breed_scope else None)
+            if validators is not None:
+                return not_modified_response(*validators)
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+
+            etag, last_modified = remember_validators(url, version, response.get_data())
+            if is_not_modified(request, etag, last_modified):
+                return not_modified_response(etag, last_modified)
+            set_validators(response, etag, last_modified)
+            return response
+        return wrapper
+    return decorator
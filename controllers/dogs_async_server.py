@@ -0,0 +1,266 @@
+from quart import request, jsonify, Blueprint, Response, current_app, stream_with_context, make_response
+from quart.wrappers.response import DataBody
+from mongodb_connection_manager import AsyncMongoConnectionHolder
+from dogs_cache import breed_lookup_cache, age_key, age_range_key
+from async_storage_layout import list_breed_names, find_all, find_page, find_by_id, load_age_buckets, load_breed_age_buckets, list_breed_pictures
+from conditional_requests import cached_validators, remember_validators, is_not_modified, set_validators
+from controllers.dogs_common import database_unavailable_response, json_array_item, parse_bulk_items, parse_listing_args, build_page, serialize_dog_data, group_lookups, resolve_lookups, lookup_response_body
+from functools import wraps
+import asyncio
+
+# The read endpoints of dogs_blueprint served by the ASGI app (see asgi_app.py). The
+# write endpoints stay on the synchronous blueprint, which owns the cache invalidation.
+dogs_async_blueprint = Blueprint('dogs_data_async', __name__)
+
+async def read_bulk_items():
+    """
+    Read the items of a bulk request, see parse_bulk_items
+
+    :rtype: tuple
+    """
+    return parse_bulk_items(request.mimetype, request.is_json, await request.get_data(as_text=True))
+
+def not_modified_response(etag, last_modified):
+    """
+    Build an empty 304 response carrying the validators
+    """
+    response = Response("", 304)
+    set_validators(response, etag, last_modified)
+    return response
+
+def conditional_get(breed_scope=None):
+    """
+    Add the validators of the synchronous endpoints to an async GET view and answer
+    conditional requests with 304, see conditional_requests.conditional_get
+
+    :param breed_scope: Name of the view argument holding the breed the response depends on,
+                        None if the response depends on all the dog data
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(*args, **kwargs):
+            url, version, validators = cached_validators(request, kwargs.get(breed_scope) if breed_scope else None)
+            if validators is not None:
+                return not_modified_response(*validators)
+
+            response = await make_response(await view(*args, **kwargs))
+            # Reading a streamed body would consume it
+            if response.status_code != 200 or not isinstance(response.response, DataBody):
+                return response
+
+            etag, last_modified = remember_validators(url, version, await response.get_data())
+            if is_not_modified(request, etag, last_modified):
+                return not_modified_response(etag, last_modified)
+            set_validators(response, etag, last_modified)
+            return response
+        return wrapper
+    return decorator
+
+async def stream_json_array(dogs_data):
+    """
+    Serialize dog data items as a JSON array one item at a time
+
+    :param dogs_data: Async iterable of dog data documents
+    :return: Async generator of JSON text chunks
+    """
+    yield "["
+    index = 0
+    async for dog_data in dogs_data:
+        yield json_array_item(index, dog_data, current_app.json.dumps)
+        index += 1
+    yield "]"
+
+################################# GET #################################
+
+@dogs_async_blueprint.route('/dogs_data/breeds', methods=['GET'])
+@conditional_get()
+async def get_all_dogs_breeds():
+    """
+    Retrieve a list of all dog breeds
+    """
+    db = await AsyncMongoConnectionHolder.get_db()
+    # Check if the database connection was successful
+    if db is None:
+        return database_unavailable_response()
+
+    try:
+        breeds = await list_breed_names(db)
+        return jsonify(breeds),200
+    except Exception as e:
+        return jsonify({"error": str(e)}),500
+
+@dogs_async_blueprint.route('/dogs_data/<dog_id>', methods=['GET'])
+@conditional_get()
+async def get_dog_data_by_id(dog_id):
+    """
+    Retrieve a dog data by its ID
+    """
+    db = await AsyncMongoConnectionHolder.get_db()
+    # Check if the database connection was successful
+    if db is None:
+        return database_unavailable_response()
+    try:
+        dog_data = await find_by_id(db, dog_id)
+        if dog_data:
+            return jsonify(dog_data),200
+        return jsonify({"error": "Dog data not found"}),404
+    except Exception as e:
+        return jsonify({"error": str(e)}),500
+
+@dogs_async_blueprint.route('/dogs_data/<breed_name>/<gender>/<from_age>/<to_age>', methods=['GET'])
+@conditional_get('breed_name')
+async def get_dog_data_by_breed_and_age_range(breed_name,gender,from_age,to_age):
+    """
+    Get dog data by its breed and age range
+    """
+    try:
+        cache_key = age_range_key(breed_name, gender, from_age, to_age)
+    except ValueError as e:
+        return jsonify({"error": str(e)}),500
+    found, dog_data = breed_lookup_cache.get(cache_key)
+
+    if not found:
+        db = await AsyncMongoConnectionHolder.get_db()
+        # Check if the database connection was successful
+        if db is None:
+            return database_unavailable_response()
+
+        try:
+            dog_data = (await load_age_buckets(db, breed_name, gender)).find_exact(round(float(from_age),2), round(float(to_age),2))
+            breed_lookup_cache.put(cache_key, dog_data)
+        except Exception as e:
+            return jsonify({"error": str(e)}),500
+
+    if dog_data:
+        return jsonify(dog_data),200
+    return jsonify({"error":"No data found for this breed and age range"}),404
+
+@dogs_async_blueprint.route('/dogs_data/<breed_name>/<gender>/<age>', methods=['GET'])
+@conditional_get('breed_name')
+async def get_dog_data_by_breed_and_age(breed_name,gender,age):
+    """
+    Get dog data by its breed and age
+    """
+    try:
+        cache_key = age_key(breed_name, gender, age)
+    except ValueError as e:
+        return jsonify({"error": str(e)}),500
+    found, dog_data = breed_lookup_cache.get(cache_key)
+
+    if not found:
+        db = await AsyncMongoConnectionHolder.get_db()
+        # Check if the database connection was successful
+        if db is None:
+            return database_unavailable_response()
+        try:
+            dog_data = (await load_age_buckets(db, breed_name, gender)).find_containing(round(float(age),2))
+            breed_lookup_cache.put(cache_key, dog_data)
+        except Exception as e:
+            return jsonify({"error": str(e)}),500
+
+    if dog_data:
+        return jsonify(dog_data),200
+    return jsonify({"error":"No data found for this breed and age"}),404
+
+@dogs_async_blueprint.route('/dogs_data/all', methods=['GET'])
+@conditional_get()
+async def get_all_dogs_data():
+    """
+    Retrieve a list of all dog breeds, with the stream/limit/cursor/fields options of the synchronous endpoint
+    """
+    db = await AsyncMongoConnectionHolder.get_db()
+    # Check if the database connection was successful
+    if db is None:
+        return database_unavailable_response()
+
+    options, error = parse_listing_args(request.args)
+    if error:
+        return jsonify({"error": error}),400
+    limit = options['limit']
+    after = options['after']
+    fields = options['fields']
+    projection = options['projection']
+
+    # A page is bounded by its limit, so it is built in memory to know the next cursor up front
+    if limit > 0:
+        try:
+            # Fetch one extra item to know whether there is a next page
+            dogs_data = [dog_data async for dog_data in find_page(db, after, limit + 1, projection)]
+        except Exception as e:
+            return jsonify({"error": str(e)}),500
+        page, next_cursor = build_page(dogs_data, limit, fields)
+        response = jsonify(page)
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response,200
+
+    if options['stream']:
+        # Streamed in page order, whether paginated or not: the breeds are read one after the other
+        dogs_data = find_page(db, after, 0, projection, options['batch_size'])
+        try:
+            # Fetch the first item eagerly so connection errors still produce an error response
+            first_dog_data = await dogs_data.__anext__()
+        except StopAsyncIteration:
+            first_dog_data = None
+        except Exception as e:
+            return jsonify({"error": str(e)}),500
+
+        async def selected_dogs_data():
+            if first_dog_data is None:
+                return
+            yield serialize_dog_data(first_dog_data, fields)
+            async for dog_data in dogs_data:
+                yield serialize_dog_data(dog_data, fields)
+        return Response(stream_with_context(stream_json_array)(selected_dogs_data()), status=200, mimetype='application/json')
+
+    try:
+        if options['paginated']:
+            dogs_data = [dog_data async for dog_data in find_page(db, after, 0, projection)]
+        else:
+            dogs_data = await find_all(db)
+        return jsonify([serialize_dog_data(dog_data, fields) for dog_data in dogs_data]),200
+    except Exception as e:
+        return jsonify({"error": str(e)}),500
+
+@dogs_async_blueprint.route('/dogs_data/BreedsAndUrl', methods=['GET'])
+@conditional_get()
+async def get_all_dogs_breeds_and_url():
+    """
+    Retrieve a list of all dog breeds and URL picture
+    """
+    db = await AsyncMongoConnectionHolder.get_db()
+    # Check if the database connection was successful
+    if db is None:
+        return database_unavailable_response()
+
+    try:
+        breed_images = await list_breed_pictures(db)
+        return jsonify(breed_images),200
+    except Exception as e:
+        return jsonify({"error": str(e)}),500
+
+@dogs_async_blueprint.route('/dogs_data/lookup', methods=['POST'])
+async def lookup_dogs_data():
+    """
+    Get the dog data of many (breed, gender, age) in one request, querying the breeds concurrently
+    """
+    lookups, error = await read_bulk_items()
+    if error:
+        return jsonify({"error": error}),400
+
+    db = await AsyncMongoConnectionHolder.get_db()
+    # Check if the database connection was successful
+    if db is None:
+        return database_unavailable_response()
+
+    results, lookups_by_breed = group_lookups(lookups)
+    try:
+        # At most one query per breed, all of them in flight at once
+        breed_names = list(lookups_by_breed)
+        buckets = await asyncio.gather(*(load_breed_age_buckets(db, breed_name, {gender for _, gender, _ in lookups_by_breed[breed_name]}) for breed_name in breed_names))
+        for breed_name, buckets_by_gender in zip(breed_names, buckets):
+            resolve_lookups(results, lookups_by_breed[breed_name], buckets_by_gender)
+    except Exception as e:
+        return jsonify({"error": str(e)}),500
+
+    return jsonify(lookup_response_body(results)),200
@@ -0,0 +1,264 @@
+from mongodb_health import database_health
+from storage_layout import PAGE_SORT_KEYS
+import base64
+import json
+import os
+
+# Request parsing and result building shared by the synchronous (Flask) and asynchronous
+# (Quart) dog data endpoints. Nothing here depends on the web framework: the views read
+# the request, call these helpers and build their responses from the results.
+
+# Whether /dogs_data/all streams its response unless the request says otherwise
+DOGS_STREAM_ALL = os.getenv("DOGS_STREAM_ALL", "false").lower() == "true"
+# Cursor batch size used when streaming /dogs_data/all
+DOGS_STREAM_BATCH_SIZE = int(os.getenv("DOGS_STREAM_BATCH_SIZE", "100"))
+# Maximum number of items accepted by the bulk endpoints
+DOGS_BULK_MAX_ITEMS = int(os.getenv("DOGS_BULK_MAX_ITEMS", "1000"))
+
+# The fields of a stored dog data item
+DOG_DATA_FIELDS = ['_id', 'breed_name', 'gender', 'from_age', 'to_age', 'avg_height_min', 'avg_height_max', 'avg_weight_min', 'avg_weight_max', 'avg_drink', 'avg_food', 'pic_url', 'created_at', 'updated_at']
+
+# The numeric PAGE_SORT_KEYS, the others are strings
+PAGE_NUMBER_KEYS = {'from_age'}
+
+def database_unavailable_response():
+    """
+    Build the response of a request that cannot reach the database, telling the client when to retry.
+    Flask and Quart both serialize the dictionary body as JSON.
+    """
+    return {"error": "The database is unavailable"}, 503, {"Retry-After": str(database_health.retry_after())}
+
+def encode_page_cursor(dog_data):
+    """
+    Build the opaque cursor pointing after a dog data item
+
+    :param dog_data: The last dog data item of a page
+    :rtype: str
+    """
+    key = json.dumps([dog_data[field] for field in PAGE_SORT_KEYS])
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+def decode_page_cursor(cursor):
+    """
+    Read the PAGE_SORT_KEYS values back from an opaque cursor
+
+    :param cursor: The cursor returned with the previous page
+    :rtype: list
+    :raises ValueError: If the cursor is malformed
+    """
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(key, list) or len(key) != len(PAGE_SORT_KEYS):
+        raise ValueError("Invalid cursor")
+    # The values end up in the query filter, anything but plain values could inject query operators
+    for field, value in zip(PAGE_SORT_KEYS, key):
+        expected_types = (int, float) if field in PAGE_NUMBER_KEYS else str
+        if not isinstance(value, expected_types) or isinstance(value, bool):
+            raise ValueError("Invalid cursor")
+    return key
+
+def select_fields(dog_data, fields):
+    """
+    Keep only the requested fields of a dog data item
+
+    :param dog_data: The dog data
+    :param fields: The requested fields, None for all of them
+    :rtype: dict
+    """
+    if fields is None:
+        return dog_data
+    return {field: value for field, value in dog_data.items() if field in fields}
+
+def serialize_dog_data(dog_data, fields=None):
+    """
+    Prepare a dog data item for a JSON response: keep the requested fields and turn its _id into a string
+
+    :param dog_data: The dog data
+    :param fields: The requested fields, None for all of them
+    :rtype: dict
+    """
+    dog_data = select_fields(dog_data, fields)
+    if '_id' in dog_data:
+        dog_data['_id'] = str(dog_data['_id'])
+    return dog_data
+
+def json_array_item(index, dog_data, dumps):
+    """
+    Serialize a dog data item as an element of a JSON array streamed one item at a time
+
+    :param index: The position of the item in the array
+    :param dog_data: The dog data
+    :param dumps: The JSON serializer of the app
+    :rtype: str
+    """
+    return ("," if index else "") + dumps(serialize_dog_data(dog_data))
+
+def parse_bulk_items(mimetype, is_json, body):
+    """
+    Read the items of a bulk request, either a JSON array or an NDJSON stream
+    (Content-Type: application/x-ndjson, one JSON object per line)
+
+    :param mimetype: The mimetype of the request
+    :param is_json: Whether the request has a JSON mimetype
+    :param body: The request body as text
+    :return: (items, None) if the body could be read, (None, error message) otherwise.
+             An NDJSON line that is not valid JSON is returned as None.
+    :rtype: tuple
+    """
+    if mimetype == 'application/x-ndjson':
+        items = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                items.append(None)
+    else:
+        try:
+            items = json.loads(body) if is_json else None
+        except ValueError:
+            items = None
+        if not isinstance(items, list):
+            return None, "The request body must be a JSON array or an NDJSON stream"
+    if len(items) > DOGS_BULK_MAX_ITEMS:
+        return None, f"A bulk request may contain at most {DOGS_BULK_MAX_ITEMS} items"
+    return items, None
+
+def parse_listing_args(args):
+    """
+    Validate the query arguments of /dogs_data/all
+
+    :param args: The query arguments of the request
+    :return: (options, None) if the arguments are valid, (None, error message) otherwise. The options are
+             limit, batch_size, after (the decoded cursor), fields, projection, paginated (whether the items
+             must be read in page order) and stream.
+    :rtype: tuple
+    """
+    try:
+        limit = int(args.get('limit', 0))
+        batch_size = int(args.get('batch_size', DOGS_STREAM_BATCH_SIZE))
+    except ValueError:
+        return None, "'limit' and 'batch_size' must be integers"
+    if limit < 0 or batch_size < 0:
+        return None, "'limit' and 'batch_size' must not be negative"
+
+    after = None
+    if 'cursor' in args:
+        try:
+            after = decode_page_cursor(args['cursor'])
+        except ValueError as e:
+            return None, str(e)
+
+    fields = None
+    projection = None
+    if 'fields' in args:
+        fields = [field.strip() for field in args['fields'].split(',') if field.strip()]
+        unknown_fields = [field for field in fields if field not in DOG_DATA_FIELDS]
+        if not fields or unknown_fields:
+            return None, f"'fields' must be a comma separated list of {DOG_DATA_FIELDS}"
+        # The sort keys are always fetched so the next page can be computed
+        projection = {field: 1 for field in set(fields) | set(PAGE_SORT_KEYS)}
+
+    return {
+        "limit": limit,
+        "batch_size": batch_size,
+        "after": after,
+        "fields": fields,
+        "projection": projection,
+        "paginated": limit > 0 or after is not None or fields is not None,
+        "stream": args.get('stream', str(DOGS_STREAM_ALL)).lower() == 'true'
+    }, None
+
+def build_page(dogs_data, limit, fields):
+    """
+    Build a page of /dogs_data/all from the items read for it
+
+    :param dogs_data: The items read in page order, one more than the limit if there is a next page
+    :param limit: The page size
+    :param fields: The requested fields, None for all of them
+    :return: (page items, cursor of the next page or None)
+    :rtype: tuple
+    """
+    page = [serialize_dog_data(dog_data, fields) for dog_data in dogs_data[:limit]]
+    next_cursor = encode_page_cursor(dogs_data[limit - 1]) if len(dogs_data) > limit else None
+    return page, next_cursor
+
+def sweep_overlapping_items(group, existing_items):
+    """
+    Split the new dog data items of a breed into the ones that can be inserted and the ones overlapping
+    either the existing dog data or another item of the request. Touching ranges (to_age == from_age) do
+    not overlap. Sorted by age per gender, an item overlaps the request if it starts before the furthest
+    end accepted so far; the first item of an overlapping pair in age order wins, the lowest index on ties.
+
+    :param group: The new items of the breed, as (index, dog data item)
+    :param existing_items: The existing dog data of the breed overlapping any of the new items
+    :return: (items to insert as (index, dog data item), error message per rejected index)
+    :rtype: tuple
+    """
+    to_insert = []
+    rejected = {}
+    furthest_to_ages = {}
+    for index, dog_data_item in sorted(group, key=lambda candidate: (candidate[1]['gender'], candidate[1]['from_age'], candidate[1]['to_age'], candidate[0])):
+        gender = dog_data_item['gender']
+        if any(existing['gender'] == gender and existing['from_age'] < dog_data_item['to_age'] and existing['to_age'] > dog_data_item['from_age'] for existing in existing_items):
+            rejected[index] = "Overlapping age range exists for this breed"
+        elif gender in furthest_to_ages and dog_data_item['from_age'] < furthest_to_ages[gender]:
+            rejected[index] = "Overlapping age range within the request"
+        else:
+            to_insert.append((index, dog_data_item))
+            furthest_to_ages[gender] = max(furthest_to_ages.get(gender, dog_data_item['to_age']), dog_data_item['to_age'])
+    return to_insert, rejected
+
+def group_lookups(lookups):
+    """
+    Validate the lookups of POST /dogs_data/lookup and group the valid ones by breed
+
+    :param lookups: The requested {"breed_name", "gender", "age"} lookups
+    :return: (results with the errors of the invalid lookups filled in, valid lookups per breed as (index, gender, age))
+    :rtype: tuple
+    """
+    results = [None] * len(lookups)
+    lookups_by_breed = {}
+    for index, lookup in enumerate(lookups):
+        if not isinstance(lookup, dict) or not all(key in lookup for key in ['breed_name', 'gender', 'age']):
+            results[index] = {"index": index, "status": 400, "error": "Invalid request"}
+            continue
+        # Both are used as keys and in queries, anything but plain strings could inject query operators
+        if not isinstance(lookup['breed_name'], str) or not isinstance(lookup['gender'], str):
+            results[index] = {"index": index, "status": 400, "error": "'breed_name' and 'gender' must be strings"}
+            continue
+        try:
+            age = round(float(lookup['age']), 2)
+        except (TypeError, ValueError):
+            results[index] = {"index": index, "status": 400, "error": "Invalid number format"}
+            continue
+        lookups_by_breed.setdefault(lookup['breed_name'], []).append((index, lookup['gender'], age))
+    return results, lookups_by_breed
+
+def resolve_lookups(results, breed_lookups, buckets_by_gender):
+    """
+    Fill in the results of the lookups of a breed from its age buckets
+
+    :param results: The results of every lookup, by index
+    :param breed_lookups: The lookups of the breed, as (index, gender, age)
+    :param buckets_by_gender: The age buckets of the looked up genders of the breed
+    """
+    for index, gender, age in breed_lookups:
+        dog_data = buckets_by_gender[gender].find_containing(age)
+        if dog_data:
+            results[index] = {"index": index, "status": 200, "dog_data": dog_data}
+        else:
+            results[index] = {"index": index, "status": 404, "error": "No data found for this breed and age"}
+
+def lookup_response_body(results):
+    """
+    Build the body of the response of POST /dogs_data/lookup
+
+    :param results: The results of every lookup, in request order
+    :rtype: dict
+    """
+    found = sum(1 for result in results if result['status'] == 200)
+    return {"found": found, "not_found": len(results) - found, "results": results}
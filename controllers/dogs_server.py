@@ -1,10 +1,209 @@
-from flask import request, jsonify, Blueprint
-from mongodb_connection_manager import MongoConnectionHolder
+from flask import request, jsonify, Blueprint, Response, current_app, stream_with_context
+from storage_backend import get_dogs_repository, is_read_only_backend, refresh_storage_backend
+from dogs_cache import breed_lookup_cache, age_key, age_range_key
+from cache_invalidation import cache_invalidator, start_cache_invalidation, publish_change
+from storage_layout import breed_name_error
+from age_intervals import age_interval_index
+from conditional_requests import conditional_get, data_versions
+from controllers.dogs_common import sweep_overlapping_items, database_unavailable_response, json_array_item, parse_bulk_items, parse_listing_args, build_page, serialize_dog_data, group_lookups, resolve_lookups, lookup_response_body
 from datetime import datetime
+from itertools import chain
+import time
 import uuid
 
 dogs_blueprint = Blueprint('dogs_data', __name__)
 
+# Methods that never write, allowed on a read-only storage backend
+SAFE_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+def build_dog_data_item(data):
+    """
+    Validate a dog data creation request and build the dog data item to insert
+
+    :param data: The requested dog data
+    :return: (dog data item, None) if the request is valid, (None, error message) otherwise
+    :rtype: tuple
+    """
+    # Check if the request is valid
+    if not isinstance(data, dict) or not all(key in data for key in ['breed_name', 'gender', 'from_age', 'to_age', 'avg_height_min', 'avg_height_max', 'avg_weight_min', 'avg_weight_max','avg_drink','avg_food','pic_url']):
+        return None, "Invalid request"
+
+    # Ensure that double values are rounded to two decimal places
+    try:
+        numeric_fields = {
+            'from_age': round(float(data['from_age']), 2),
+            'to_age': round(float(data['to_age']), 2),
+            'avg_height_min': round(float(data['avg_height_min']), 2),
+            'avg_height_max': round(float(data['avg_height_max']), 2),
+            'avg_weight_min': round(float(data['avg_weight_min']), 2),
+            'avg_weight_max': round(float(data['avg_weight_max']), 2),
+            'avg_drink': round(float(data['avg_drink']), 2),
+            'avg_food': round(float(data['avg_food']), 2)
+        }
+    except (TypeError, ValueError):
+        return None, "Invalid number format"
+
+    error = breed_name_error(data['breed_name'])
+    if error:
+        return None, error
+
+    gender = data['gender']
+    if gender not in ['Male','Female']:
+        return None, "Gender must be Male or Female"
+
+    if numeric_fields['from_age'] > numeric_fields['to_age']:
+        return None, "'from_age' must be smaller than 'to_age'"
+
+    if numeric_fields['avg_height_min'] > numeric_fields['avg_height_max']:
+        return None, "'avg_height_min' must be smaller than 'avg_height_max'"
+
+    if numeric_fields['avg_weight_min'] > numeric_fields['avg_weight_max']:
+        return None, "'avg_weight_min' must be smaller than 'avg_weight_max'"
+
+    # Create the dog data item
+    dog_data_item = {
+        "_id": str(uuid.uuid4()),
+        "breed_name": data['breed_name'],
+        "gender": data['gender'],
+        "from_age": numeric_fields['from_age'],
+        "to_age": numeric_fields['to_age'],
+        "avg_height_min":numeric_fields['avg_height_min'],
+        "avg_height_max":numeric_fields['avg_height_max'],
+        "avg_weight_min":numeric_fields['avg_weight_min'],
+        "avg_weight_max":numeric_fields['avg_weight_max'],
+        "avg_drink":numeric_fields['avg_drink'],
+        "avg_food":numeric_fields['avg_food'],
+        "pic_url": data['pic_url'],
+        "created_at": datetime.now(),
+        "updated_at": datetime.now()
+    }
+    return dog_data_item, None
+
+def record_dog_data_created(dog_data_items):
+    """
+    Update the response caches after dog data items were inserted
+
+    :param dog_data_items: The inserted dog data items
+    """
+    for dog_data_item in dog_data_items:
+        breed_lookup_cache.invalidate_range(dog_data_item['breed_name'], dog_data_item['gender'], dog_data_item['from_age'], dog_data_item['to_age'])
+    for breed_name in {dog_data_item['breed_name'] for dog_data_item in dog_data_items}:
+        data_versions.bump(breed_name)
+    for dog_data_item in dog_data_items:
+        publish_change(dog_data_event("insert", dog_data_item['breed_name'], dog_data_item['gender'], dog_data_item['from_age'], dog_data_item['to_age']))
+
+def dog_data_event(operation, breed_name, gender, from_age, to_age):
+    """
+    Build the cache invalidation event of a write to a dog data item
+
+    :rtype: dict
+    """
+    return {"operation": operation, "breed_name": breed_name, "gender": gender, "from_age": float(from_age), "to_age": float(to_age)}
+
+def build_dog_data_updates(data):
+    """
+    Validate a dog data update request and build the fields to set
+
+    :param data: The requested updates
+    :return: (fields to set, None) if the request is valid, (None, error message) otherwise
+    :rtype: tuple
+    """
+    if not isinstance(data, dict):
+        return None, "Invalid request"
+    updates = {"updated_at": datetime.now()}
+    try:
+        for field in ['avg_height_min','avg_height_max', 'avg_weight_min','avg_weight_max','avg_drink','avg_food','pic_url']:
+            if field in data:
+                updates[field] = round(float(data[field]), 2) if field.startswith('avg_') else data[field]
+    except (TypeError, ValueError):
+        return None, "Invalid number format"
+
+    # Ranges can only be checked when both of their ends are updated
+    if 'avg_height_min' in updates and 'avg_height_max' in updates and updates['avg_height_min'] > updates['avg_height_max']:
+        return None, "'avg_height_min' must be smaller than 'avg_height_max'"
+
+    if 'avg_weight_min' in updates and 'avg_weight_max' in updates and updates['avg_weight_min'] > updates['avg_weight_max']:
+        return None, "'avg_weight_min' must be smaller than 'avg_weight_max'"
+    return updates, None
+
+def record_dog_data_updated(breed_name, gender, from_age, to_age):
+    """
+    Update the response caches after a dog data item was updated
+
+    :param breed_name: The breed of the updated dog data
+    :param gender: The gender of the updated dog data
+    :param from_age: The start of the updated age range
+    :param to_age: The end of the updated age range
+    """
+    breed_lookup_cache.invalidate_range(breed_name, gender, from_age, to_age)
+    data_versions.bump(breed_name)
+    publish_change(dog_data_event("update", breed_name, gender, from_age, to_age))
+
+def record_dog_data_deleted(breed_name, gender, from_age, to_age):
+    """
+    Update the response caches after a dog data item was deleted
+
+    :param breed_name: The breed of the deleted dog data
+    :param gender: The gender of the deleted dog data
+    :param from_age: The start of the deleted age range
+    :param to_age: The end of the deleted age range
+    """
+    breed_lookup_cache.invalidate_range(breed_name, gender, from_age, to_age)
+    data_versions.bump(breed_name)
+    publish_change(dog_data_event("delete", breed_name, gender, from_age, to_age))
+
+def read_bulk_items():
+    """
+    Read the items of a bulk request, see parse_bulk_items
+
+    :rtype: tuple
+    """
+    return parse_bulk_items(request.mimetype, request.is_json, request.get_data(as_text=True))
+
+def bulk_response(results):
+    """
+    Build the response of a bulk request from its per-item results
+
+    :param results: One {"index", "status", ...} result per requested item
+    :return: 200/201 if every item succeeded, 500 if none did and an item failed with a server error,
+             400 if none did because of the request, 207 otherwise
+    """
+    succeeded = sum(1 for result in results if result['status'] < 300)
+    if succeeded == len(results):
+        status = results[0]['status'] if results else 200
+    elif succeeded == 0:
+        status = 500 if any(result['status'] >= 500 for result in results) else 400
+    else:
+        status = 207
+    return jsonify({"succeeded": succeeded, "failed": len(results) - succeeded, "results": results}),status
+
+def stream_json_array(dogs_data):
+    """
+    Serialize dog data items as a JSON array one item at a time
+
+    :param dogs_data: Iterable of dog data documents
+    :return: Generator of JSON text chunks
+    """
+    yield "["
+    for index, dog_data in enumerate(dogs_data):
+        yield json_array_item(index, dog_data, current_app.json.dumps)
+    yield "]"
+
+@dogs_blueprint.before_request
+def check_storage_backend():
+    """
+    Reload the storage backend if its data changed, start the local change feed if it is
+    configured, and reject writes to a read-only backend
+    """
+    refresh_storage_backend()
+    # The change stream is started with the MongoDB connection, the local feed needs no database
+    start_cache_invalidation()
+    # The lookup is a read sent with POST
+    if is_read_only_backend() and request.method not in SAFE_METHODS and request.endpoint != f"{dogs_blueprint.name}.lookup_dogs_data":
+        # A 405 must list the methods the URL still allows
+        allowed_methods = current_app.url_map.bind_to_environ(request.environ).allowed_methods(request.path)
+        return jsonify({"error": "The dog data is read-only"}),405,{"Allow": ", ".join(sorted(method for method in allowed_methods if method in SAFE_METHODS))}
+
 ################################# POST #################################
 
 # 1. Create a new dog data
@@ -73,85 +272,112 @@ def create_dog_data():
             description: The request was invalid
         500:
             description: An error occurred while creating the dog data
+        503:
+            description: The database is unavailable
     """
     data = request.json
-    db = MongoConnectionHolder.get_db()
+    repository = get_dogs_repository()
 
     # Check if the database connection was successful
-    if db is None:
-        return jsonify({"error": "Could not connect to the database"}), 500
+    if repository is None:
+        return database_unavailable_response()
     
-    # Check if the request is valid
-    if not all(key in data for key in ['breed_name', 'gender', 'from_age', 'to_age', 'avg_height_min', 'avg_height_max', 'avg_weight_min', 'avg_weight_max','avg_drink','avg_food','pic_url']):
-        return jsonify({"error": "Invalid request"}), 400
-
-   # Ensure that double values are rounded to two decimal places
-    try:
-        numeric_fields = {
-            'from_age': round(float(data['from_age']), 2),
-            'to_age': round(float(data['to_age']), 2),
-            'avg_height_min': round(float(data['avg_height_min']), 2),
-            'avg_height_max': round(float(data['avg_height_max']), 2),
-            'avg_weight_min': round(float(data['avg_weight_min']), 2),
-            'avg_weight_max': round(float(data['avg_weight_max']), 2),
-            'avg_drink': round(float(data['avg_drink']), 2),
-            'avg_food': round(float(data['avg_food']), 2)
-        }
-    except ValueError:
-        return jsonify({"error": "Invalid number format"}), 400
-    
-    gender = data['gender']
-    if gender not in ['Male','Female']:
-        return jsonify({"error" : "Gender must be Male or Female"}),400
-    
-    if numeric_fields['from_age'] > numeric_fields['to_age']:
-        return jsonify({"error":"'from_age' must be smaller than 'to_age'"}),400
-    
-    if numeric_fields['avg_height_min'] > numeric_fields['avg_height_max']:
-        return jsonify({"error":"'avg_height_min' must be smaller than 'avg_height_max'"}),400
-    
-    if numeric_fields['avg_weight_min'] > numeric_fields['avg_weight_max']:
-        return jsonify({"error":"'avg_weight_min' must be smaller than 'avg_weight_max'"}),400
-
-    package_collection = db[data['breed_name']]
+    dog_data_item, error = build_dog_data_item(data)
+    if error:
+        return jsonify({"error": error}),400
 
-    overlapping_data = package_collection.find_one({
-        "gender": gender,
-        "$and" : [
-            {"from_age": {"$lt":numeric_fields['to_age']}, "to_age":{"$gt": numeric_fields['from_age']}}
-            ]
-        })
-    
-    if overlapping_data:
+    if repository.find_overlapping(dog_data_item['breed_name'], [dog_data_item]):
         return jsonify({"error": "Overlapping age range exists for this breed"}),400
 
-    # Create the dog data item
-    dog_data_item = {
-        "_id": str(uuid.uuid4()),
-        "breed_name": data['breed_name'],
-        "gender": data['gender'],
-        "from_age": numeric_fields['from_age'],
-        "to_age": numeric_fields['to_age'],
-        "avg_height_min":numeric_fields['avg_height_min'],
-        "avg_height_max":numeric_fields['avg_height_max'],
-        "avg_weight_min":numeric_fields['avg_weight_min'],
-        "avg_weight_max":numeric_fields['avg_weight_max'],
-        "avg_drink":numeric_fields['avg_drink'],
-        "avg_food":numeric_fields['avg_food'],
-        "pic_url": data['pic_url'],
-        "created_at": datetime.now(),
-        "updated_at": datetime.now()
-    }
-
     # Insert the dog breed into the database
-    package_collection.insert_one(dog_data_item)
+    error, = repository.insert_many(dog_data_item['breed_name'], [dog_data_item])
+    if error:
+        return jsonify({"error": error}),500
+    record_dog_data_created([dog_data_item])
 
     return jsonify({"message": "Dog data created successfully", '_id': dog_data_item['_id']}), 201
 
+# Create many dog data items
+@dogs_blueprint.route('/dogs_data/bulk', methods=['POST'])
+def create_dogs_data_bulk():
+    """
+    Create many dog data items in one request
+    ---
+    consumes:
+        - application/json
+        - application/x-ndjson
+    parameters:
+        - name: dogs_data
+          in: body
+          required: true
+          description: Array of dog data to create (or one dog data JSON object per line with Content-Type application/x-ndjson)
+          schema:
+            type: array
+            items:
+                $ref: '#/definitions/dog_data'
+    responses:
+        201:
+            description: Every dog data was created successfully
+        207:
+            description: Some dog data were created, see the per-item results
+        400:
+            description: No dog data was created, see the per-item results
+        500:
+            description: An error occurred while creating the dog data, or no dog data was created and some failed with a server error
+        503:
+            description: The database is unavailable
+    """
+    items, error = read_bulk_items()
+    if error:
+        return jsonify({"error": error}),400
+
+    repository = get_dogs_repository()
+    # Check if the database connection was successful
+    if repository is None:
+        return database_unavailable_response()
+
+    results = [None] * len(items)
+    # Valid items per breed, as (index, dog data item)
+    candidates = {}
+    for index, data in enumerate(items):
+        dog_data_item, error = build_dog_data_item(data)
+        if error:
+            results[index] = {"index": index, "status": 400, "error": error}
+        else:
+            candidates.setdefault(dog_data_item['breed_name'], []).append((index, dog_data_item))
+
+    try:
+        for breed_name, group in candidates.items():
+            # Fetch the existing dog data overlapping any item of the breed at once
+            existing_items = repository.find_overlapping(breed_name, [dog_data_item for _, dog_data_item in group])
+
+            to_insert, rejected = sweep_overlapping_items(group, existing_items)
+            for index, error in rejected.items():
+                results[index] = {"index": index, "status": 400, "error": error}
+            if not to_insert:
+                continue
+
+            errors = repository.insert_many(breed_name, [dog_data_item for _, dog_data_item in to_insert])
+
+            inserted_items = []
+            for (index, dog_data_item), error in zip(to_insert, errors):
+                if error:
+                    results[index] = {"index": index, "status": 500, "error": error}
+                else:
+                    results[index] = {"index": index, "status": 201, "_id": dog_data_item['_id']}
+                    inserted_items.append(dog_data_item)
+            if inserted_items:
+                record_dog_data_created(inserted_items)
+    except Exception as e:
+        return jsonify({"error": str(e), "results": [result for result in results if result]}),500
+
+    return bulk_response(results)
+
 ################################# GET #################################
 
 # 2. Get All dogs' breeds
 @dogs_blueprint.route('/dogs_data/breeds', methods=['GET'])
+@conditional_get()
 def get_all_dogs_breeds():
     """
     Retrieve a list of all dog breeds
@@ -159,23 +385,28 @@ def get_all_dogs_breeds():
     responses:
         200:
             description: Dogs' breeds retrieved successfully
+        304:
+            description: The cached copy identified by If-None-Match is still current
         500:
             description: An error occurred while deleting the dog data
+        503:
+            description: The database is unavailable
     """
 
-    db = MongoConnectionHolder.get_db()
+    repository = get_dogs_repository()
     # Check if the database connection was successful
-    if db is None:
-        return jsonify({"error": "Could not connect to the database"}), 500
+    if repository is None:
+        return database_unavailable_response()
     
     try:
-        breeds = db.list_collection_names()
+        breeds = repository.list_breeds()
         return jsonify(breeds),200
     except Exception as e:
         return jsonify({"error": str(e)}),500
 
 # 3. Get dog data by ID
 @dogs_blueprint.route('/dogs_data/<dog_id>', methods=['GET'])
+@conditional_get()
 def get_dog_data_by_id(dog_id):
     """
     Retrieve a dog data by its ID
@@ -188,27 +419,31 @@ def get_dog_data_by_id(dog_id):
     responses:
         200:
             description: Dog data retrieved successfully
+        304:
+            description: The cached copy identified by If-None-Match / If-Modified-Since is still current
         404:
             description: Dog data not found
         500:
             description: An error occurred while deleting the dog data
+        503:
+            description: The database is unavailable
     """
 
-    db = MongoConnectionHolder.get_db()
+    repository = get_dogs_repository()
     # Check if the database connection was successful
-    if db is None:
-        return jsonify({"error": "Could not connect to the database"}), 500
+    if repository is None:
+        return database_unavailable_response()
     try:
-        for breed in db.list_collection_names():
-            dog_data = db[breed].find_one({"_id": dog_id})
-            if dog_data:
-                return jsonify(dog_data),200
+        dog_data = repository.get_by_id(dog_id)
+        if dog_data:
+            return jsonify(dog_data),200
         return jsonify({"error": "Dog data not found"}),404
     except Exception as e:
         return jsonify({"error": str(e)}),500
 
 # 4. Get specified dog data by breed and age reange
 @dogs_blueprint.route('/dogs_data/<breed_name>/<gender>/<from_age>/<to_age>', methods=['GET'])
+@conditional_get('breed_name')
 def get_dog_data_by_breed_and_age_range(breed_name,gender,from_age,to_age):
     """
     Get dog data by its breed and age range
@@ -233,28 +468,41 @@ def get_dog_data_by_breed_and_age_range(breed_name,gender,from_age,to_age):
     responses:
         200:
             description: Dog data retrieved successfully
+        304:
+            description: The cached copy identified by If-None-Match / If-Modified-Since is still current
         404:
             description: Dog data not found
         500:
             description: An error occurred while deleting the dog data
+        503:
+            description: The database is unavailable
     """
 
-    db = MongoConnectionHolder.get_db()
-    # Check if the database connection was successful
-    if db is None:
-        return jsonify({"error": "Could not connect to the database"}), 500
-    
     try:
-        package_collection = db[breed_name]
-        dog_data = package_collection.find_one({"gender" : gender,"from_age":round(float(from_age),2),"to_age":round(float(to_age),2)})
-        if dog_data:
-            return jsonify(dog_data),200 
-        return jsonify({"error":"No data found for this breed and age range"}),404
-    except Exception as e:
+        cache_key = age_range_key(breed_name, gender, from_age, to_age)
+    except ValueError as e:
         return jsonify({"error": str(e)}),500
+    found, dog_data = breed_lookup_cache.get(cache_key)
+
+    if not found:
+        repository = get_dogs_repository()
+        # Check if the database connection was successful
+        if repository is None:
+            return database_unavailable_response()
+
+        try:
+            dog_data = repository.find_by_range(breed_name, gender, round(float(from_age),2), round(float(to_age),2))
+            breed_lookup_cache.put(cache_key, dog_data)
+        except Exception as e:
+            return jsonify({"error": str(e)}),500
+
+    if dog_data:
+        return jsonify(dog_data),200
+    return jsonify({"error":"No data found for this breed and age range"}),404
 
 # Get specified dog data by breed and age
 @dogs_blueprint.route('/dogs_data/<breed_name>/<gender>/<age>', methods=['GET'])
+@conditional_get('breed_name')
 def get_dog_data_by_breed_and_age(breed_name,gender,age):
     """
     Get dog data by its breed and age
@@ -275,60 +523,124 @@ def get_dog_data_by_breed_and_age(breed_name,gender,age):
     responses:
         200:
             description: Dog data retrieved successfully
+        304:
+            description: The cached copy identified by If-None-Match / If-Modified-Since is still current
         404:
             description: Dog data not found
         500:
             description: An error occurred while deleting the dog data
+        503:
+            description: The database is unavailable
     """
 
-    db = MongoConnectionHolder.get_db()
-    # Check if the database connection was successful
-    if db is None:
-        return jsonify({"error": "Could not connect to the database"}), 500
     try:
-        age = round(float(age),2)
-        package_collection = db[breed_name]
-        dog_data = package_collection.find_one({
-            "gender": gender,
-            "from_age":{"$lte":age},
-            "to_age":{"$gte":age}
-        })
-        if dog_data:
-            return jsonify(dog_data),200
-        return jsonify({"error":"No data found for this breed and age"}),404
-    except Exception as e:
+        cache_key = age_key(breed_name, gender, age)
+    except ValueError as e:
         return jsonify({"error": str(e)}),500
+    found, dog_data = breed_lookup_cache.get(cache_key)
+
+    if not found:
+        repository = get_dogs_repository()
+        # Check if the database connection was successful
+        if repository is None:
+            return database_unavailable_response()
+        try:
+            dog_data = repository.find_by_age(breed_name, gender, round(float(age),2))
+            breed_lookup_cache.put(cache_key, dog_data)
+        except Exception as e:
+            return jsonify({"error": str(e)}),500
+
+    if dog_data:
+        return jsonify(dog_data),200
+    return jsonify({"error":"No data found for this breed and age"}),404
 
 # 5. Get all dogs data
 @dogs_blueprint.route('/dogs_data/all', methods=['GET'])
+@conditional_get()
 def get_all_dogs_data():
     """
     Retrieve a list of all dog breeds
     ---
+    parameters:
+        - name: stream
+          in: query
+          required: false
+          description: Stream the JSON array from the database cursors instead of building it in memory (true/false)
+        - name: batch_size
+          in: query
+          required: false
+          description: The cursor batch size used when streaming
+        - name: limit
+          in: query
+          required: false
+          description: The maximum number of dog data items to return, the cursor of the next page is returned in the X-Next-Cursor header
+        - name: cursor
+          in: query
+          required: false
+          description: The X-Next-Cursor header of the previous page
+        - name: fields
+          in: query
+          required: false
+          description: Comma separated list of the fields to return
     responses:
         200:
             description: Dogs' breeds retrieved successfully
+        304:
+            description: The cached copy identified by If-None-Match is still current
+        400:
+            description: The paging parameters were invalid
         500:
             description: An error occurred while deleting the dog data
+        503:
+            description: The database is unavailable
     """
-    db = MongoConnectionHolder.get_db()
+    repository = get_dogs_repository()
     # Check if the database connection was successful
-    if db is None:
-        return jsonify({"error": "Could not connect to the database"}), 500
-    
+    if repository is None:
+        return database_unavailable_response()
+
+    options, error = parse_listing_args(request.args)
+    if error:
+        return jsonify({"error": error}),400
+    limit = options['limit']
+    after = options['after']
+    fields = options['fields']
+    projection = options['projection']
+
+    # A page is bounded by its limit, so it is built in memory to know the next cursor up front
+    if limit > 0:
+        try:
+            # Fetch one extra item to know whether there is a next page
+            dogs_data = list(repository.find_page(after, limit + 1, projection))
+        except Exception as e:
+            return jsonify({"error": str(e)}),500
+        page, next_cursor = build_page(dogs_data, limit, fields)
+        response = jsonify(page)
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response,200
+
+    if options['stream']:
+        try:
+            dogs_data = repository.find_page(after, 0, projection, options['batch_size']) if options['paginated'] else repository.find_all(options['batch_size'])
+            # Fetch the first item eagerly so connection errors still produce an error response
+            first_dog_data = next(dogs_data, None)
+        except Exception as e:
+            return jsonify({"error": str(e)}),500
+        if first_dog_data is not None:
+            dogs_data = chain([first_dog_data], dogs_data)
+        dogs_data = (serialize_dog_data(dog_data, fields) for dog_data in dogs_data)
+        return Response(stream_with_context(stream_json_array(dogs_data)), status=200, mimetype='application/json')
+
     try:
-        all_dogs=[]
-        for breed in db.list_collection_names():
-            breed_data = db[breed].find()
-            for dog_data in breed_data:
-                dog_data['_id'] = str(dog_data['_id'])
-                all_dogs.append(dog_data)
-        return jsonify(all_dogs),200
+        dogs_data = repository.find_page(after, 0, projection) if options['paginated'] else repository.find_all(concurrent=True)
+        return jsonify([serialize_dog_data(dog_data, fields) for dog_data in dogs_data]),200
     except Exception as e:
         return jsonify({"error": str(e)}),500
 
-# 6. Get all dogs breeds and URL - BUG
+# 6. Get all dogs breeds and URL
 @dogs_blueprint.route('/dogs_data/BreedsAndUrl', methods=['GET'])
+@conditional_get()
 def get_all_dogs_breeds_and_url():
     """
     Retrieve a list of all dog breeds and URL picture
@@ -336,24 +648,86 @@ def get_all_dogs_breeds_and_url():
     responses:
         200:
             description: Dogs' breeds retrieved successfully
+        304:
+            description: The cached copy identified by If-None-Match is still current
         500:
             description: An error occurred while deleting the dog data
+        503:
+            description: The database is unavailable
     """
 
-    db = MongoConnectionHolder.get_db()
+    repository = get_dogs_repository()
     # Check if the database connection was successful
-    if db is None:
-        return jsonify({"error": "Could not connect to the database"}), 500
+    if repository is None:
+        return database_unavailable_response()
     
     try:
-        breed_images = []
-        for breed in db.list_collection_names():
-            breed_data = db[breed].find()
-            breed_images.append({"breed_name":breed, "pic_url":breed_data[0]["pic_url"]})
+        breed_images = repository.list_breed_pictures()
         return jsonify(breed_images),200
     except Exception as e:
         return jsonify({"error": str(e)}),500
 
+# Get many dog data by breed, gender and age
+@dogs_blueprint.route('/dogs_data/lookup', methods=['POST'])
+def lookup_dogs_data():
+    """
+    Get the dog data of many (breed, gender, age) in one request
+    ---
+    consumes:
+        - application/json
+        - application/x-ndjson
+    parameters:
+        - name: lookups
+          in: body
+          required: true
+          description: Array of lookups (or one lookup JSON object per line with Content-Type application/x-ndjson)
+          schema:
+            type: array
+            items:
+                id: lookup
+                required:
+                    - breed_name
+                    - gender
+                    - age
+                properties:
+                    breed_name:
+                        type: string
+                        description: The name of the dog's breed
+                    gender:
+                        type: string
+                        description: Male or female
+                    age:
+                        type: string
+                        description: The age of the dog
+    responses:
+        200:
+            description: The lookups were resolved, each result (in request order) has its own status and dog data or error
+        400:
+            description: The request was invalid
+        500:
+            description: An error occurred while retrieving the dog data
+        503:
+            description: The database is unavailable
+    """
+    lookups, error = read_bulk_items()
+    if error:
+        return jsonify({"error": error}),400
+
+    repository = get_dogs_repository()
+    # Check if the database connection was successful
+    if repository is None:
+        return database_unavailable_response()
+
+    results, lookups_by_breed = group_lookups(lookups)
+    try:
+        for breed_name, breed_lookups in lookups_by_breed.items():
+            # At most one query per breed, none if its genders are already loaded in memory
+            resolve_lookups(results, breed_lookups, repository.age_buckets(breed_name, {gender for _, gender, _ in breed_lookups}))
+    except Exception as e:
+        return jsonify({"error": str(e)}),500
+
+    return jsonify(lookup_response_body(results)),200
+
 ################################# UPDATE #################################
 
 # 7. Update dog data by breed and age range
@@ -418,41 +792,156 @@ def update_dog_data_by_breed_and_age_range(breed_name,gender,from_age,to_age):
     responses:
         200:
             description: Dog data updated successfully
+        400:
+            description: The request was invalid
         404:
             description: Dog data not found
         500:
             description: An error occurred while updating the dog data
+        503:
+            description: The database is unavailable
     """
 
     data = request.json
-    db = MongoConnectionHolder.get_db()
+    repository = get_dogs_repository()
 
     # Check if the database connection was successful
-    if db is None:
-        return jsonify({"error": "Could not connect to the database"}), 500
+    if repository is None:
+        return database_unavailable_response()
     
-    if round(float(data['avg_height_min']),2) > round(float(data['avg_height_max']),2):
-        return jsonify({"error":"'avg_height_min' must be smaller than 'avg_height_max'"}),400
-    
-    if round(float(data['avg_weight_min']),2) > round(float(data['avg_weight_max']),2):
-        return jsonify({"error":"'avg_weight_min' must be smaller than 'avg_weight_max'"}),400
+    updates, error = build_dog_data_updates(data)
+    if error:
+        return jsonify({"error": error}),400
     try:
-        package_collection = db[breed_name]
-        updates = {"updated_at":datetime.now()}
-        for field in ['avg_height_min','avg_height_max', 'avg_weight_min','avg_weight_max','avg_drink','avg_food','pic_url']:
-            if field in data:
-                updates[field] = round(float(data[field]), 2) if field.startswith('avg_') else data[field]
-        result = package_collection.update_one(
-            {"from_age":float(from_age),"to_age":float(to_age),"gender":gender},
-            {"$set":updates}
-        )
-        if result.matched_count == 0:
+        updated_dog_data = repository.update(breed_name, {"from_age":round(float(from_age),2),"to_age":round(float(to_age),2),"gender":gender}, updates)
+        if updated_dog_data is None:
             return jsonify({"error":"No data found for this breed and age range"}),404
-        updated_dog_data = package_collection.find_one({"from_age": float(from_age) , "to_age":float(to_age)})
+        record_dog_data_updated(breed_name, gender, from_age, to_age)
         return jsonify(updated_dog_data),200
     except Exception as e:
         return jsonify({"error": str(e)}),500
 
+# Update many dog data items
+@dogs_blueprint.route('/dogs_data/bulk', methods=['PATCH'])
+def update_dogs_data_bulk():
+    """
+    Update many dog data items, identified by breed, gender and age range, in one request
+    ---
+    consumes:
+        - application/json
+        - application/x-ndjson
+    parameters:
+        - name: updates
+          in: body
+          required: true
+          description: Array of updates (or one update JSON object per line with Content-Type application/x-ndjson)
+          schema:
+            type: array
+            items:
+                id: BulkUpdate
+                required:
+                    - breed_name
+                    - gender
+                    - from_age
+                    - to_age
+                properties:
+                    breed_name:
+                        type: string
+                        description: The breed_name of the dog data to update
+                    gender:
+                        type: string
+                        description: The gender of the dog data to update
+                    from_age:
+                        type: string
+                        description: The from_age of the dog data to update
+                    to_age:
+                        type: string
+                        description: The to_age of the dog data to update
+                    return_document:
+                        type: boolean
+                        description: Return the updated dog data in the item's result
+                    avg_height_min:
+                        type: string
+                        description: The aevrage height of the dog
+                    avg_height_max:
+                        type: string
+                        description: The aevrage height of the dog
+                    avg_weight_min:
+                        type: string
+                        description: The average weight of the dog
+                    avg_weight_max:
+                        type: string
+                        description: The average weight of the dog
+                    avg_drink:
+                        type: string
+                        description: The average drinking recommended for the dog
+                    avg_food:
+                        type: string
+                        description: The average eating recommended for the dog
+                    pic_url:
+                        type: string
+                        description: URL of picture of the dog breed
+    responses:
+        200:
+            description: Every dog data was updated successfully
+        207:
+            description: Some dog data were updated, see the per-item results
+        400:
+            description: No dog data was updated, see the per-item results
+        500:
+            description: An error occurred while updating the dog data, or no dog data was updated and some failed with a server error
+        503:
+            description: The database is unavailable
+    """
+    items, error = read_bulk_items()
+    if error:
+        return jsonify({"error": error}),400
+
+    repository = get_dogs_repository()
+    # Check if the database connection was successful
+    if repository is None:
+        return database_unavailable_response()
+
+    results = [None] * len(items)
+    # Valid updates per breed, as (index, key, fields to set, return the document)
+    updates_by_breed = {}
+    seen_keys = set()
+    for index, data in enumerate(items):
+        if not isinstance(data, dict) or not all(key in data for key in ['breed_name', 'gender', 'from_age', 'to_age']):
+            results[index] = {"index": index, "status": 400, "error": "Invalid request"}
+            continue
+        if not isinstance(data['breed_name'], str) or not isinstance(data['gender'], str):
+            results[index] = {"index": index, "status": 400, "error": "'breed_name' and 'gender' must be strings"}
+            continue
+        updates, error = build_dog_data_updates(data)
+        if not error:
+            try:
+                key = {"gender": data['gender'], "from_age": round(float(data['from_age']), 2), "to_age": round(float(data['to_age']), 2)}
+            except (TypeError, ValueError):
+                error = "Invalid number format"
+        if error:
+            results[index] = {"index": index, "status": 400, "error": error}
+            continue
+        if (data['breed_name'], key['gender'], key['from_age'], key['to_age']) in seen_keys:
+            results[index] = {"index": index, "status": 400, "error": "Duplicate update for this breed and age range"}
+            continue
+        seen_keys.add((data['breed_name'], key['gender'], key['from_age'], key['to_age']))
+        updates_by_breed.setdefault(data['breed_name'], []).append((index, key, updates, bool(data.get('return_document'))))
+
+    try:
+        for breed_name, breed_updates in updates_by_breed.items():
+            breed_results = repository.update_many(breed_name, [(key, updates, return_document) for _, key, updates, return_document in breed_updates])
+            for (index, key, _, _), (status, updated_dog_data, error) in zip(breed_updates, breed_results):
+                if status == 200:
+                    results[index] = {"index": index, "status": 200, "dog_data": updated_dog_data} if updated_dog_data else {"index": index, "status": 200}
+                    record_dog_data_updated(breed_name, key['gender'], key['from_age'], key['to_age'])
+                else:
+                    results[index] = {"index": index, "status": status, "error": error}
+    except Exception as e:
+        return jsonify({"error": str(e), "results": [result for result in results if result]}),500
+
+    return bulk_response(results)
+
 ################################# DELETE #################################
 
 # 8. Delete all dogs data
@@ -463,20 +952,27 @@ def delete_all_dogs_data():
     ---
     responses:
         200:
-            description: All dogs data deleted successfully
+            description: All dogs data deleted successfully, with the DOGS_DELETE_ALL_MODE used and the time it took
         500:
             description: An error occurred while deleting all dog data
+        503:
+            description: The database is unavailable
     """
 
-    db = MongoConnectionHolder.get_db()
+    repository = get_dogs_repository()
     # Check if the database connection was successful
-    if db is None:
-        return jsonify({"error": "Could not connect to the database"}), 500
+    if repository is None:
+        return database_unavailable_response()
     
     try:
-        for collection_name in db.list_collection_names():
-            db[collection_name].drop()
-        return jsonify({"message": "All dog data deleted successfully"}),200
+        started_at = time.perf_counter()
+        mode = repository.delete_all()
+        data_versions.bump()
+        breed_lookup_cache.clear()
+        # Without a breed, every cache is invalidated
+        publish_change({"operation": "dropDatabase"})
+        elapsed_ms = round((time.perf_counter() - started_at) * 1000, 1)
+        return jsonify({"message": "All dog data deleted successfully", "mode": mode, "elapsed_ms": elapsed_ms}),200
     except Exception as e:
         return jsonify({"error": str(e)}),500
 
@@ -510,17 +1006,19 @@ def delete_dog_data_by_breed_and_age(breed,gender,from_age,to_age):
             description: No data found for the specified breed and age range
         500:
             description: An error occurred while deleting all dog data
+        503:
+            description: The database is unavailable
     """
 
-    db = MongoConnectionHolder.get_db()
+    repository = get_dogs_repository()
     # Check if the database connection was successful
-    if db is None:
-        return jsonify({"error": "Could not connect to the database"}), 500
+    if repository is None:
+        return database_unavailable_response()
     
     try:
-        package_collection = db[breed]
-        result = package_collection.delete_one({"gender" : gender, "from_age": float(from_age), "to_age":float(to_age)})
-        if result.deleted_count > 0:
+        deleted_dog_data = repository.delete_by_range(breed, gender, float(from_age), float(to_age))
+        if deleted_dog_data:
+            record_dog_data_deleted(breed, gender, from_age, to_age)
             return jsonify({"message": "Dog data deleted successfully"}),200
         else:
             return jsonify({"error": "Dog data not found for this breed and age range"}),404
@@ -544,18 +1042,36 @@ def delete_dog_data_by_uuid(dog_uuid):
             description: All dogs data deleted successfully
         500:
             description: An error occurred while deleting all dog data
+        503:
+            description: The database is unavailable
     """
 
-    db = MongoConnectionHolder.get_db()
+    repository = get_dogs_repository()
     # Check if the database connection was successful
-    if db is None:
-        return jsonify({"error": "Could not connect to the database"}), 500
+    if repository is None:
+        return database_unavailable_response()
     
     try:
-        for breed in db.list_collection_names():
-            result = db[breed].delete_one({"_id":dog_uuid})
-            if result.deleted_count > 0:
-                return jsonify({"message": "Dog data deleted successfully"}),200
+        deleted_dog_data = repository.delete_by_id(dog_uuid)
+        if deleted_dog_data:
+            record_dog_data_deleted(deleted_dog_data['breed_name'], deleted_dog_data['gender'], deleted_dog_data['from_age'], deleted_dog_data['to_age'])
+            return jsonify({"message": "Dog data deleted successfully"}),200
         return jsonify({"message": "Dog data not found"}),404
     except Exception as e:
-        return jsonify({"error": str(e)}),500
\ No newline at end of file
+        return jsonify({"error": str(e)}),500
+################################# CACHE #################################
+
+# 11. Get the lookup cache statistics
+@dogs_blueprint.route('/dogs_data/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """
+    Retrieve the hit/miss/eviction counters of the breed, gender and age lookup cache,
+    the size of the age interval index and the counters of the invalidations received from the change feed
+    ---
+    responses:
+        200:
+            description: Cache statistics retrieved successfully
+    """
+
+    age_index = {"size": age_interval_index.size(), "max_size": age_interval_index.max_size}
+    return jsonify({**breed_lookup_cache.stats(), "age_index": age_index, "invalidation": cache_invalidator.stats()}),200
@@ -0,0 +1,140 @@
+from collections import OrderedDict
+import os
+import threading
+import time
+
+DOGS_CACHE_MAX_SIZE = int(os.getenv("DOGS_CACHE_MAX_SIZE", "1024"))
+DOGS_CACHE_TTL_SECONDS = float(os.getenv("DOGS_CACHE_TTL_SECONDS", "300"))
+
+def age_key(breed_name, gender, age):
+    """
+    Build the cache key of a lookup by breed, gender and age
+
+    :rtype: tuple
+    """
+    return ("age", breed_name, gender, round(float(age), 2))
+
+def age_range_key(breed_name, gender, from_age, to_age):
+    """
+    Build the cache key of a lookup by breed, gender and age range
+
+    :rtype: tuple
+    """
+    return ("range", breed_name, gender, round(float(from_age), 2), round(float(to_age), 2))
+
+class LookupCache:
+    """
+    Bounded LRU cache with a per-entry TTL for the breed/gender/age lookups.
+
+    Both found dog data and misses (None) are cached. Writes invalidate exactly the
+    entries whose result may have changed via invalidate_range.
+    """
+
+    def __init__(self, max_size=DOGS_CACHE_MAX_SIZE, ttl_seconds=DOGS_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__counters = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def get(self, key):
+        """
+        Get a cached lookup result
+
+        :param key: The lookup key
+        :return: (True, value) on a hit, (False, None) on a miss
+        :rtype: tuple
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                self.__counters["misses"] += 1
+                return False, None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self.__entries[key]
+                self.__counters["expirations"] += 1
+                self.__counters["misses"] += 1
+                return False, None
+            self.__entries.move_to_end(key)
+            self.__counters["hits"] += 1
+            return True, value
+
+    def put(self, key, value):
+        """
+        Cache a lookup result, evicting the least recently used entry when full
+
+        :param key: The lookup key
+        :param value: The dog data, or None if nothing was found
+        """
+        if self.max_size <= 0:
+            return
+        with self.__lock:
+            self.__entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.max_size:
+                self.__entries.popitem(last=False)
+                self.__counters["evictions"] += 1
+
+    def invalidate_range(self, breed_name, gender, from_age, to_age):
+        """
+        Drop the entries affected by a write to the given age range: lookups of an
+        age inside the range and lookups of exactly this range
+
+        :param breed_name: The name of the breed
+        :param gender: The gender of the written dog data
+        :param from_age: The start of the written age range
+        :param to_age: The end of the written age range
+        """
+        from_age = round(float(from_age), 2)
+        to_age = round(float(to_age), 2)
+        with self.__lock:
+            stale_keys = []
+            for key in self.__entries:
+                if key[1] != breed_name or key[2] != gender:
+                    continue
+                if key[0] == "age" and from_age <= key[3] <= to_age:
+                    stale_keys.append(key)
+                elif key[0] == "range" and key[3:] == (from_age, to_age):
+                    stale_keys.append(key)
+            for key in stale_keys:
+                del self.__entries[key]
+            self.__counters["invalidations"] += len(stale_keys)
+
+    def invalidate_breed(self, breed_name):
+        """
+        Drop every entry of a breed, when a write to it is not known more precisely
+
+        :param breed_name: The name of the breed
+        """
+        with self.__lock:
+            stale_keys = [key for key in self.__entries if key[1] == breed_name]
+            for key in stale_keys:
+                del self.__entries[key]
+            self.__counters["invalidations"] += len(stale_keys)
+
+    def clear(self):
+        """
+        Drop every entry
+        """
+        with self.__lock:
+            self.__counters["invalidations"] += len(self.__entries)
+            self.__entries.clear()
+
+    def stats(self):
+        """
+        Get the cache counters
+
+        :return: The hit/miss/eviction counters and the cache sizing
+        :rtype: dict
+        """
+        with self.__lock:
+            return {
+                **self.__counters,
+                "size": len(self.__entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds
+            }
+
+# Cache in front of the lookups by breed, gender and age (range)
+breed_lookup_cache = LookupCache()
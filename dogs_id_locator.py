@@ -0,0 +1,243 @@
+from fanout_executor import fanout_executor
+from pymongo import ReplaceOne
+from pymongo.errors import OperationFailure
+import threading
+
+# Server error code returned when transactions are used against a standalone server
+ILLEGAL_OPERATION_CODE = 20
+
+# Collection holding one {"_id": <dog uuid>, "breed_name": <breed>} document per dog data item
+ID_LOCATOR_COLLECTION = "_dogs_id_locator"
+
+class DogIdLocator:
+    """
+    Maps dog data UUIDs to the breed collection that stores them, so a lookup by ID
+    is a single indexed read instead of a scan over every breed collection.
+
+    The mapping is persisted in the locator collection (keyed by ``_id``) and mirrored
+    in an in-process dictionary that is kept in sync by the write paths.
+    """
+    __breeds_by_id = {}
+    __lock = threading.Lock()
+    # Held while the locator is made ready, so the threads of a process backfill it once
+    __ready_lock = threading.Lock()
+    __ready = False
+    __transactions_supported = True
+
+    @staticmethod
+    def ensure_ready(db, list_breeds):
+        """
+        Create the locator indexes and backfill the locator from the breed collections
+        if it is empty (e.g. data inserted before the locator existed)
+
+        :param db: MongoDB database
+        :param list_breeds: Callable returning the breed collection names, only called when a backfill is needed
+        """
+        if DogIdLocator.__ready:
+            return
+        with DogIdLocator.__ready_lock:
+            if DogIdLocator.__ready:
+                return
+            locator = db[ID_LOCATOR_COLLECTION]
+            locator.create_index("breed_name")
+            if locator.estimated_document_count() == 0:
+                # Other processes may backfill at the same time or register new items meanwhile,
+                # the backfill only upserts so it never removes nor conflicts with their entries
+                DogIdLocator.backfill(db, list_breeds(db))
+            DogIdLocator.__ready = True
+
+    @staticmethod
+    def rebuild(db, breed_names):
+        """
+        Rebuild the locator from the breed collections, dropping the entries of items
+        that are no longer stored (e.g. after a migration). Must not run while the API
+        is writing, use backfill for that.
+
+        :param db: MongoDB database
+        :param breed_names: The names of the breed collections to index
+        :return: The number of indexed dog data items
+        :rtype: int
+        """
+        DogIdLocator.clear(db)
+        return DogIdLocator.backfill(db, breed_names)
+
+    @staticmethod
+    def backfill(db, breed_names):
+        """
+        Register every dog data item of the breed collections in the locator
+
+        :param db: MongoDB database
+        :param breed_names: The names of the breed collections to index
+        :return: The number of indexed dog data items
+        :rtype: int
+        """
+        breed_names = list(breed_names)
+        # Read the IDs of every breed collection at once, then register them from this thread
+        dog_ids_by_breed = fanout_executor.map(lambda breed: [dog_data["_id"] for dog_data in db[breed].find({}, {"_id": 1})], breed_names)
+        count = 0
+        for breed, dog_ids in zip(breed_names, dog_ids_by_breed):
+            DogIdLocator.register_many(db, breed, dog_ids)
+            count += len(dog_ids)
+        return count
+
+    @staticmethod
+    def register(db, dog_id, breed_name):
+        """
+        Record that a dog data item is stored in the given breed collection
+
+        :param db: MongoDB database
+        :param dog_id: The UUID of the dog data
+        :param breed_name: The breed collection that stores it
+        """
+        db[ID_LOCATOR_COLLECTION].replace_one({"_id": dog_id}, DogIdLocator.entry(dog_id, breed_name), upsert=True)
+        DogIdLocator.remember(dog_id, breed_name)
+
+    @staticmethod
+    def register_many(db, breed_name, dog_ids):
+        """
+        Record that several dog data items are stored in the given breed collection.
+        Items that are already registered (e.g. by a concurrent backfill) are overwritten.
+
+        :param db: MongoDB database
+        :param breed_name: The breed collection that stores them
+        :param dog_ids: The UUIDs of the dog data
+        """
+        if not dog_ids:
+            return
+        db[ID_LOCATOR_COLLECTION].bulk_write([
+            ReplaceOne({"_id": dog_id}, DogIdLocator.entry(dog_id, breed_name), upsert=True)
+            for dog_id in dog_ids
+        ], ordered=False)
+        with DogIdLocator.__lock:
+            for dog_id in dog_ids:
+                DogIdLocator.__breeds_by_id[dog_id] = breed_name
+
+    @staticmethod
+    def entry(dog_id, breed_name):
+        """
+        Build the locator document of a dog data item
+
+        :rtype: dict
+        """
+        return {"_id": dog_id, "breed_name": breed_name}
+
+    @staticmethod
+    def cached(dog_id):
+        """
+        Get the breed collection of a dog data item from the in-process mapping only
+
+        :param dog_id: The UUID of the dog data
+        :return: The breed name, or None if it is not in memory
+        :rtype: str
+        """
+        with DogIdLocator.__lock:
+            return DogIdLocator.__breeds_by_id.get(dog_id)
+
+    @staticmethod
+    def remember(dog_id, breed_name):
+        """
+        Add a locator entry (e.g. read from the locator collection) to the in-process mapping
+
+        :param dog_id: The UUID of the dog data
+        :param breed_name: The breed collection that stores it, None to remove the entry
+        """
+        with DogIdLocator.__lock:
+            if breed_name is None:
+                DogIdLocator.__breeds_by_id.pop(dog_id, None)
+            else:
+                DogIdLocator.__breeds_by_id[dog_id] = breed_name
+
+    @staticmethod
+    def resolve(db, dog_id):
+        """
+        Find the breed collection that stores a dog data item
+
+        :param db: MongoDB database
+        :param dog_id: The UUID of the dog data
+        :return: The breed name, or None if the ID is unknown
+        :rtype: str
+        """
+        breed_name = DogIdLocator.cached(dog_id)
+        if breed_name is not None:
+            return breed_name
+
+        entry = db[ID_LOCATOR_COLLECTION].find_one({"_id": dog_id})
+        if entry is None:
+            return None
+        DogIdLocator.remember(dog_id, entry["breed_name"])
+        return entry["breed_name"]
+
+    @staticmethod
+    def forget(db, dog_id):
+        """
+        Remove a dog data item from the locator
+
+        :param db: MongoDB database
+        :param dog_id: The UUID of the dog data
+        """
+        db[ID_LOCATOR_COLLECTION].delete_one({"_id": dog_id})
+        DogIdLocator.remember(dog_id, None)
+
+    @staticmethod
+    def delete_record(db, dog_id):
+        """
+        Delete a dog data item by its UUID together with its locator entry.
+
+        The owning breed collection is resolved through the locator, so exactly one
+        delete is issued against breed data. Both deletes run in a single transaction
+        when the deployment supports it.
+
+        :param db: MongoDB database
+        :param dog_id: The UUID of the dog data
+        :return: The deleted dog data, or None if not found
+        :rtype: dict
+        """
+        breed_name = DogIdLocator.resolve(db, dog_id)
+        if breed_name is None:
+            return None
+
+        def delete(session=None):
+            deleted_dog_data = db[breed_name].find_one_and_delete({"_id": dog_id}, session=session)
+            # Drop the entry even if the record was already gone, it is stale either way
+            db[ID_LOCATOR_COLLECTION].delete_one({"_id": dog_id}, session=session)
+            return deleted_dog_data
+
+        deleted_dog_data = None
+        transaction_committed = False
+        if DogIdLocator.__transactions_supported:
+            try:
+                with db.client.start_session() as session:
+                    deleted_dog_data = session.with_transaction(delete)
+                    transaction_committed = True
+            except OperationFailure as e:
+                if e.code != ILLEGAL_OPERATION_CODE:
+                    raise
+                # Standalone server, fall back to sequential deletes from now on
+                DogIdLocator.__transactions_supported = False
+        if not transaction_committed:
+            deleted_dog_data = delete()
+
+        with DogIdLocator.__lock:
+            DogIdLocator.__breeds_by_id.pop(dog_id, None)
+        return deleted_dog_data
+
+    @staticmethod
+    def clear(db):
+        """
+        Remove every entry from the locator
+
+        :param db: MongoDB database
+        """
+        db[ID_LOCATOR_COLLECTION].delete_many({})
+        with DogIdLocator.__lock:
+            DogIdLocator.__breeds_by_id.clear()
+
+    @staticmethod
+    def reset():
+        """
+        Forget the in-process state after the locator collection was dropped, so its
+        indexes are created again on next use
+        """
+        with DogIdLocator.__lock:
+            DogIdLocator.__breeds_by_id.clear()
+        DogIdLocator.__ready = False
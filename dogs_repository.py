@@ -0,0 +1,165 @@
+class ReadOnlyRepositoryError(Exception):
+    """
+    Raised by the write operations of a read-only repository
+    """
+
+class DogsRepository:
+    """
+    The storage operations behind the dog data endpoints.
+
+    A dog data item is identified either by its UUID (``_id``) or by its breed, gender
+    and age range. Implementations keep their own storage bookkeeping (indexes, summaries,
+    in-memory age buckets) current; the HTTP layer only maintains the response caches.
+    """
+
+    def list_breeds(self):
+        """
+        List the names of the stored breeds
+
+        :return: The sorted breed names
+        :rtype: list
+        """
+        raise NotImplementedError
+
+    def list_breed_pictures(self):
+        """
+        List every breed with the picture URL of its first dog data item
+
+        :return: List of {"breed_name", "pic_url"} items sorted by breed name
+        :rtype: list
+        """
+        raise NotImplementedError
+
+    def find_all(self, batch_size=0, concurrent=False):
+        """
+        Iterate over every stored dog data item
+
+        :param batch_size: The number of items read at once, 0 for the backend default
+        :param concurrent: Whether to read all the breeds at once when the backend supports it
+        :return: Iterator of dog data
+        """
+        raise NotImplementedError
+
+    def find_page(self, after=None, limit=0, projection=None, batch_size=0):
+        """
+        Iterate over the dog data items in PAGE_SORT_KEYS order
+
+        :param after: The PAGE_SORT_KEYS values of the last item of the previous page, None to start from the beginning
+        :param limit: The maximum number of items, 0 for no limit
+        :param projection: The fields to return, the backend may return more
+        :param batch_size: The number of items read at once, 0 for the backend default
+        :return: Iterator of dog data
+        """
+        raise NotImplementedError
+
+    def get_by_id(self, dog_id):
+        """
+        Find a dog data item by its UUID
+
+        :param dog_id: The UUID of the dog data
+        :return: The dog data, or None if not found
+        :rtype: dict
+        """
+        raise NotImplementedError
+
+    def age_buckets(self, breed_name, genders):
+        """
+        Get the age buckets of several genders of a breed
+
+        :param breed_name: The name of the breed
+        :param genders: The genders of the dog
+        :return: Dictionary of gender to AgeBuckets
+        :rtype: dict
+        """
+        raise NotImplementedError
+
+    def find_by_age(self, breed_name, gender, age):
+        """
+        Find the dog data of a breed and gender whose age range contains an age
+
+        :return: The dog data, or None if not found
+        :rtype: dict
+        """
+        return self.age_buckets(breed_name, [gender])[gender].find_containing(age)
+
+    def find_by_range(self, breed_name, gender, from_age, to_age):
+        """
+        Find the dog data of a breed and gender with exactly this age range
+
+        :return: The dog data, or None if not found
+        :rtype: dict
+        """
+        return self.age_buckets(breed_name, [gender])[gender].find_exact(from_age, to_age)
+
+    def find_overlapping(self, breed_name, dog_data_items):
+        """
+        Find the stored age ranges of a breed overlapping any of the given dog data items
+
+        :param breed_name: The breed of the dog data items
+        :param dog_data_items: The dog data items about to be created
+        :return: List of {"gender", "from_age", "to_age"} of the overlapping stored items
+        :rtype: list
+        """
+        raise NotImplementedError
+
+    def insert_many(self, breed_name, dog_data_items):
+        """
+        Insert dog data items of a breed, without checking for overlaps
+
+        :param breed_name: The breed of the dog data items
+        :param dog_data_items: The dog data items to insert
+        :return: One error message per item, None for the inserted ones
+        :rtype: list
+        """
+        raise NotImplementedError
+
+    def update(self, breed_name, key, updates):
+        """
+        Update the dog data identified by its breed and key
+
+        :param breed_name: The name of the breed
+        :param key: The {"gender", "from_age", "to_age"} of the dog data
+        :param updates: The fields to set
+        :return: The updated dog data, or None if not found
+        :rtype: dict
+        """
+        raise NotImplementedError
+
+    def update_many(self, breed_name, updates):
+        """
+        Update several dog data items of a breed
+
+        :param breed_name: The name of the breed
+        :param updates: List of (key, fields to set, whether to return the updated document)
+        :return: One (status, updated dog data or None, error message or None) per update
+        :rtype: list
+        """
+        raise NotImplementedError
+
+    def delete_by_id(self, dog_id):
+        """
+        Delete a dog data item by its UUID
+
+        :param dog_id: The UUID of the dog data
+        :return: The deleted dog data, or None if not found
+        :rtype: dict
+        """
+        raise NotImplementedError
+
+    def delete_by_range(self, breed_name, gender, from_age, to_age):
+        """
+        Delete the dog data of a breed and gender with exactly this age range
+
+        :return: The deleted dog data (at least its _id), or None if not found
+        :rtype: dict
+        """
+        raise NotImplementedError
+
+    def delete_all(self):
+        """
+        Delete every stored dog data item
+
+        :return: The name of the deletion mode used
+        :rtype: str
+        """
+        raise NotImplementedError
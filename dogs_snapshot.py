@@ -0,0 +1,154 @@
+from datetime import datetime
+import argparse
+import math
+import mmap
+import os
+import struct
+import uuid
+
+# Snapshot file layout (little endian):
+#   header:  magic, number of records, offset of the string table
+#   records: one fixed size record per dog data item, the string fields as offsets in the string table
+#   strings: deduplicated UTF-8 strings, each prefixed with its length
+SNAPSHOT_MAGIC = b"DOGSNAP1"
+SNAPSHOT_HEADER = struct.Struct("<8sII")
+SNAPSHOT_STRING_FIELDS = ['_id', 'breed_name', 'gender', 'pic_url']
+# Dates are stored as timestamps, a missing number is stored as NaN
+SNAPSHOT_NUMBER_FIELDS = ['from_age', 'to_age', 'avg_height_min', 'avg_height_max', 'avg_weight_min', 'avg_weight_max', 'avg_drink', 'avg_food', 'created_at', 'updated_at']
+SNAPSHOT_DATE_FIELDS = {'created_at', 'updated_at'}
+SNAPSHOT_RECORD = struct.Struct(f"<{len(SNAPSHOT_STRING_FIELDS)}I{len(SNAPSHOT_NUMBER_FIELDS)}d")
+SNAPSHOT_STRING_LENGTH = struct.Struct("<I")
+
+def write_snapshot(path, dog_data_items):
+    """
+    Write dog data items to a snapshot file. The file is replaced atomically, so
+    processes serving the previous snapshot never read a partial file.
+
+    :param path: The path of the snapshot file
+    :param dog_data_items: Iterable of dog data
+    :return: The number of written dog data items
+    :rtype: int
+    """
+    strings = {}
+    string_table = bytearray()
+    def string_offset(value):
+        value = "" if value is None else str(value)
+        if value not in strings:
+            strings[value] = len(string_table)
+            encoded = value.encode("utf-8")
+            string_table.extend(SNAPSHOT_STRING_LENGTH.pack(len(encoded)) + encoded)
+        return strings[value]
+
+    def number(dog_data, field):
+        value = dog_data.get(field)
+        if value is None:
+            return math.nan
+        if field in SNAPSHOT_DATE_FIELDS:
+            return value.timestamp() if isinstance(value, datetime) else math.nan
+        return float(value)
+
+    records = bytearray()
+    count = 0
+    for dog_data in dog_data_items:
+        records.extend(SNAPSHOT_RECORD.pack(
+            *(string_offset(dog_data.get(field)) for field in SNAPSHOT_STRING_FIELDS),
+            *(number(dog_data, field) for field in SNAPSHOT_NUMBER_FIELDS)
+        ))
+        count += 1
+
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as snapshot_file:
+        snapshot_file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, count, SNAPSHOT_HEADER.size + len(records)))
+        snapshot_file.write(records)
+        snapshot_file.write(string_table)
+    os.replace(temporary_path, path)
+    return count
+
+class DogsSnapshot:
+    """
+    A snapshot file mapped in memory. Records are decoded on access, so loading a
+    snapshot only maps the file and the pages are shared by the processes serving it.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as snapshot_file:
+            self.__buffer = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self.__strings_offset = SNAPSHOT_HEADER.unpack_from(self.__buffer, 0)
+        if magic != SNAPSHOT_MAGIC or SNAPSHOT_HEADER.size + self.count * SNAPSHOT_RECORD.size != self.__strings_offset:
+            self.__buffer.close()
+            raise ValueError(f"{path} is not a dogs data snapshot")
+
+    def string(self, offset):
+        """
+        Read a string of the string table
+        """
+        position = self.__strings_offset + offset
+        length, = SNAPSHOT_STRING_LENGTH.unpack_from(self.__buffer, position)
+        start = position + SNAPSHOT_STRING_LENGTH.size
+        return self.__buffer[start:start + length].decode("utf-8")
+
+    def record(self, index):
+        """
+        Decode the dog data item stored at an index
+
+        :param index: The index of the record, from 0 to count - 1
+        :rtype: dict
+        """
+        values = SNAPSHOT_RECORD.unpack_from(self.__buffer, SNAPSHOT_HEADER.size + index * SNAPSHOT_RECORD.size)
+        dog_data = {field: self.string(offset) for field, offset in zip(SNAPSHOT_STRING_FIELDS, values)}
+        for field, value in zip(SNAPSHOT_NUMBER_FIELDS, values[len(SNAPSHOT_STRING_FIELDS):]):
+            if math.isnan(value):
+                continue
+            dog_data[field] = datetime.fromtimestamp(value) if field in SNAPSHOT_DATE_FIELDS else value
+        return dog_data
+
+    def key(self, index):
+        """
+        Decode only what indexes a record: its _id, breed_name, gender, from_age and to_age
+
+        :param index: The index of the record, from 0 to count - 1
+        :rtype: dict
+        """
+        values = SNAPSHOT_RECORD.unpack_from(self.__buffer, SNAPSHOT_HEADER.size + index * SNAPSHOT_RECORD.size)
+        return {
+            "_id": self.string(values[0]),
+            "breed_name": self.string(values[1]),
+            "gender": self.string(values[2]),
+            "from_age": values[len(SNAPSHOT_STRING_FIELDS)],
+            "to_age": values[len(SNAPSHOT_STRING_FIELDS) + 1],
+            "_record": index
+        }
+
+def mock_dog_data():
+    """
+    Get the mock data of popultae_db with stable UUIDs derived from their breed, gender and age range
+
+    :return: Generator of dog data
+    """
+    # Imported on use, the snapshot backend reads this module on every startup
+    from popultae_db import mock_data
+    for mock in mock_data:
+        for data in mock:
+            key = f"{data['breed_name']}/{data['gender']}/{data['from_age']}/{data['to_age']}"
+            yield {**data, "_id": str(uuid.uuid5(uuid.NAMESPACE_URL, key))}
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the dogs data to a snapshot file served with DOGS_STORAGE_BACKEND=snapshot")
+    parser.add_argument("path", help="The snapshot file to write")
+    parser.add_argument("--source", choices=["mongodb", "mock"], default="mongodb", help="Export the MongoDB data or the mock data of popultae_db")
+    args = parser.parse_args()
+
+    if args.source == "mock":
+        count = write_snapshot(args.path, mock_dog_data())
+    else:
+        from mongodb_connection_manager import MongoConnectionHolder
+        from storage_layout import find_all
+        db = MongoConnectionHolder.get_db()
+        if db is None:
+            print("Failed to connect to the database")
+            return
+        count = write_snapshot(args.path, find_all(db))
+    print(f"Exported {count} dog data items to {args.path}")
+
+if __name__ == "__main__":
+    main()
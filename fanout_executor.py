@@ -0,0 +1,93 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import os
+import threading
+
+# Sized like the MongoDB connection pool by default, a larger fan-out would only wait for connections
+DOGS_FANOUT_WORKERS = int(os.getenv("DOGS_FANOUT_WORKERS", os.getenv("DB_MAX_POOL_SIZE", "50")))
+
+FANOUT_THREAD_PREFIX = "dogs-fanout"
+
+class FanoutExecutor:
+    """
+    Bounded thread pool shared by the queries that span several breed collections,
+    so they run concurrently instead of adding up one round trip per collection.
+
+    The pool is created lazily by each process (its threads do not survive a fork).
+    Work submitted from one of its own threads runs inline to avoid deadlocking the pool.
+    """
+
+    def __init__(self, max_workers=DOGS_FANOUT_WORKERS):
+        self.max_workers = max(1, max_workers)
+        self.__executor = None
+        self.__pid = None
+        self.__lock = threading.Lock()
+
+    def map(self, fn, items):
+        """
+        Run fn on every item concurrently
+
+        :param fn: Callable run on each item
+        :param items: The items, e.g. breed names
+        :return: The results, in the order of the items
+        :rtype: list
+        :raises Exception: The first exception raised by fn, in the order of the items
+        """
+        items = list(items)
+        if len(items) <= 1 or self.__in_worker():
+            return [fn(item) for item in items]
+        futures = [self.__get_executor().submit(fn, item) for item in items]
+        try:
+            return [future.result() for future in futures]
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def first_hit(self, fn, items):
+        """
+        Run fn on every item concurrently and return the first result that is not None.
+        Work that has not started yet is cancelled as soon as a result is found.
+
+        :param fn: Callable run on each item, returning None when the item is not a hit
+        :param items: The items, e.g. breed names
+        :return: The first result that is not None, or None if there is no hit
+        :raises Exception: An exception raised by fn, if no item is a hit
+        """
+        items = list(items)
+        if len(items) <= 1 or self.__in_worker():
+            for item in items:
+                result = fn(item)
+                if result is not None:
+                    return result
+            return None
+
+        pending = {self.__get_executor().submit(fn, item) for item in items}
+        error = None
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is not None:
+                        error = error or future.exception()
+                    elif future.result() is not None:
+                        return future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+        if error is not None:
+            raise error
+        return None
+
+    def __get_executor(self):
+        with self.__lock:
+            if self.__executor is None or self.__pid != os.getpid():
+                # An executor inherited from the parent process has no threads left
+                self.__executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=FANOUT_THREAD_PREFIX)
+                self.__pid = os.getpid()
+            return self.__executor
+
+    @staticmethod
+    def __in_worker():
+        return threading.current_thread().name.startswith(FANOUT_THREAD_PREFIX)
+
+# Fan-out across the breed collections
+fanout_executor = FanoutExecutor()
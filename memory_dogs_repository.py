@@ -0,0 +1,168 @@
+from dogs_repository import DogsRepository
+from age_intervals import AgeBuckets
+from storage_layout import PAGE_SORT_KEYS
+import json
+import os
+import threading
+import uuid
+
+# JSON array of dog data items loaded into the in-memory backend on startup
+DOGS_MEMORY_SEED_FILE = os.getenv("DOGS_MEMORY_SEED_FILE")
+
+class MemoryDogsRepository(DogsRepository):
+    """
+    Dog data held in the memory of the process, for benchmarks of the HTTP layer and
+    deployments serving static data. Nothing is persisted and every process has its own copy.
+
+    The items of every (breed, gender) are kept in sorted AgeBuckets, so the age lookups
+    and the overlap check are binary searches. Writes rebuild the buckets they touch under
+    a lock and swap them in, so the age lookups read them without locking.
+    """
+
+    def __init__(self, dog_data_items=()):
+        self.__lock = threading.Lock()
+        # Breed name -> {dog UUID: dog data}, in insertion order
+        self.__breeds = {}
+        self.__breeds_by_id = {}
+        self.__buckets = {}
+        with self.__lock:
+            for dog_data in dog_data_items:
+                self.__insert(dog_data)
+
+    def list_breeds(self):
+        with self.__lock:
+            return sorted(self.__breeds)
+
+    def list_breed_pictures(self):
+        with self.__lock:
+            return [{"breed_name": breed_name, "pic_url": next(iter(self.__breeds[breed_name].values()))['pic_url']} for breed_name in sorted(self.__breeds)]
+
+    def find_all(self, batch_size=0, concurrent=False):
+        with self.__lock:
+            dogs_data = [dog_data for breed_name in sorted(self.__breeds) for dog_data in self.__breeds[breed_name].values()]
+        return (dict(dog_data) for dog_data in dogs_data)
+
+    def find_page(self, after=None, limit=0, projection=None, batch_size=0):
+        dogs_data = sorted(self.find_all(), key=lambda dog_data: [dog_data[key] for key in PAGE_SORT_KEYS])
+        if after:
+            dogs_data = [dog_data for dog_data in dogs_data if [dog_data[key] for key in PAGE_SORT_KEYS] > list(after)]
+        return iter(dogs_data[:limit] if limit else dogs_data)
+
+    def get_by_id(self, dog_id):
+        with self.__lock:
+            breed_name = self.__breeds_by_id.get(dog_id)
+            dog_data = self.__breeds[breed_name][dog_id] if breed_name is not None else None
+        return dict(dog_data) if dog_data is not None else None
+
+    def age_buckets(self, breed_name, genders):
+        return {gender: self.__buckets.get((breed_name, gender)) or AgeBuckets([]) for gender in genders}
+
+    def find_overlapping(self, breed_name, dog_data_items):
+        overlapping = []
+        for dog_data_item in dog_data_items:
+            buckets = self.__buckets.get((breed_name, dog_data_item['gender']))
+            existing = buckets.find_overlapping(dog_data_item['from_age'], dog_data_item['to_age']) if buckets else None
+            if existing is not None:
+                overlapping.append({"gender": existing['gender'], "from_age": existing['from_age'], "to_age": existing['to_age']})
+        return overlapping
+
+    def insert_many(self, breed_name, dog_data_items):
+        errors = []
+        with self.__lock:
+            for dog_data_item in dog_data_items:
+                if dog_data_item['_id'] in self.__breeds_by_id:
+                    errors.append(f"Duplicate _id {dog_data_item['_id']}")
+                else:
+                    self.__insert(dict(dog_data_item))
+                    errors.append(None)
+        return errors
+
+    def update(self, breed_name, key, updates):
+        with self.__lock:
+            dog_data = self.__find_by_key(breed_name, key)
+            if dog_data is None:
+                return None
+            updated_dog_data = {**dog_data, **updates}
+            self.__replace(dog_data, updated_dog_data)
+        return dict(updated_dog_data)
+
+    def update_many(self, breed_name, updates):
+        results = []
+        for key, fields, return_document in updates:
+            updated_dog_data = self.update(breed_name, key, fields)
+            if updated_dog_data is None:
+                results.append((404, None, "No data found for this breed and age range"))
+            else:
+                results.append((200, updated_dog_data if return_document else None, None))
+        return results
+
+    def delete_by_id(self, dog_id):
+        with self.__lock:
+            breed_name = self.__breeds_by_id.get(dog_id)
+            if breed_name is None:
+                return None
+            dog_data = self.__breeds[breed_name][dog_id]
+            self.__replace(dog_data, None)
+        return dog_data
+
+    def delete_by_range(self, breed_name, gender, from_age, to_age):
+        with self.__lock:
+            dog_data = self.__find_by_key(breed_name, {"gender": gender, "from_age": from_age, "to_age": to_age})
+            if dog_data is None:
+                return None
+            self.__replace(dog_data, None)
+        return dog_data
+
+    def delete_all(self):
+        with self.__lock:
+            self.__breeds = {}
+            self.__breeds_by_id = {}
+            self.__buckets = {}
+        return "memory"
+
+    def __find_by_key(self, breed_name, key):
+        buckets = self.__buckets.get((breed_name, key['gender']))
+        return buckets.find_exact(key['from_age'], key['to_age']) if buckets else None
+
+    def __insert(self, dog_data):
+        self.__breeds.setdefault(dog_data['breed_name'], {})[dog_data['_id']] = dog_data
+        self.__breeds_by_id[dog_data['_id']] = dog_data['breed_name']
+        self.__rebuild_buckets(dog_data['breed_name'], dog_data['gender'])
+
+    def __replace(self, dog_data, new_dog_data):
+        # Replace (or remove when new_dog_data is None) a stored item, its breed and gender never change
+        breed_name = dog_data['breed_name']
+        if new_dog_data is None:
+            del self.__breeds[breed_name][dog_data['_id']]
+            del self.__breeds_by_id[dog_data['_id']]
+            if not self.__breeds[breed_name]:
+                del self.__breeds[breed_name]
+        else:
+            self.__breeds[breed_name][dog_data['_id']] = new_dog_data
+        self.__rebuild_buckets(breed_name, dog_data['gender'])
+
+    def __rebuild_buckets(self, breed_name, gender):
+        dog_data_items = [dog_data for dog_data in self.__breeds.get(breed_name, {}).values() if dog_data['gender'] == gender]
+        if dog_data_items:
+            self.__buckets[(breed_name, gender)] = AgeBuckets(dog_data_items)
+        else:
+            self.__buckets.pop((breed_name, gender), None)
+
+def load_seed_file(path):
+    """
+    Read the dog data items of a seed file
+
+    :param path: Path of a JSON array of dog data items, None for no seed
+    :return: The dog data items
+    :rtype: list
+    """
+    if not path:
+        return []
+    with open(path) as seed_file:
+        dog_data_items = json.load(seed_file)
+    for dog_data in dog_data_items:
+        dog_data.setdefault('_id', str(uuid.uuid4()))
+    return dog_data_items
+
+# Dog data of the in-memory backend
+memory_dogs_repository = MemoryDogsRepository(load_seed_file(DOGS_MEMORY_SEED_FILE))
@@ -0,0 +1,82 @@
+from mongodb_connection_manager import MongoConnectionHolder
+from dogs_id_locator import DogIdLocator
+from storage_layout import DOGS_DATA_COLLECTION, PER_BREED_LAYOUT, SINGLE_COLLECTION_LAYOUT, STORAGE_LAYOUTS, ensure_indexes, list_breed_names
+from pymongo import ReplaceOne
+import argparse
+
+def copy_documents(collection, documents):
+    """
+    Upsert documents into a collection by their _id, so a migration can be safely re-run
+
+    :param collection: The target collection
+    :param documents: The documents to copy
+    :return: The number of copied documents
+    :rtype: int
+    """
+    operations = [ReplaceOne({"_id": document["_id"]}, document, upsert=True) for document in documents]
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+    return len(operations)
+
+def migrate_to_single_collection(db, keep_source=False):
+    """
+    Move every per-breed collection into the consolidated dogs_data collection
+
+    :param db: MongoDB database
+    :param keep_source: Keep the per-breed collections after copying them
+    :return: The number of migrated dog data items
+    :rtype: int
+    """
+    ensure_indexes(db, SINGLE_COLLECTION_LAYOUT)
+    target = db[DOGS_DATA_COLLECTION]
+    count = 0
+    for breed in list_breed_names(db, PER_BREED_LAYOUT):
+        copied = copy_documents(target, db[breed].find())
+        print(f"Copied {copied} dog data items of {breed}")
+        count += copied
+        if not keep_source:
+            db[breed].drop()
+    if not keep_source:
+        DogIdLocator.clear(db)
+    return count
+
+def migrate_to_per_breed(db, keep_source=False):
+    """
+    Split the consolidated dogs_data collection into one collection per breed
+
+    :param db: MongoDB database
+    :param keep_source: Keep the dogs_data collection after copying it
+    :return: The number of migrated dog data items
+    :rtype: int
+    """
+    source = db[DOGS_DATA_COLLECTION]
+    count = 0
+    for breed in source.distinct("breed_name"):
+        copied = copy_documents(db[breed], source.find({"breed_name": breed}))
+        print(f"Copied {copied} dog data items of {breed}")
+        count += copied
+    DogIdLocator.rebuild(db, list_breed_names(db, PER_BREED_LAYOUT))
+    ensure_indexes(db, PER_BREED_LAYOUT)
+    if not keep_source:
+        source.drop()
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate the dogs data between storage layouts")
+    parser.add_argument("target", choices=STORAGE_LAYOUTS, help="The storage layout to migrate to")
+    parser.add_argument("--keep-source", action="store_true", help="Keep the source collections after migrating")
+    args = parser.parse_args()
+
+    db = MongoConnectionHolder.get_db()
+    if db is None:
+        print("Failed to connect to the database")
+        return
+
+    if args.target == SINGLE_COLLECTION_LAYOUT:
+        count = migrate_to_single_collection(db, args.keep_source)
+    else:
+        count = migrate_to_per_breed(db, args.keep_source)
+    print(f"Migrated {count} dog data items to the {args.target} layout, set DOGS_STORAGE_LAYOUT={args.target} to use it")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+from dogs_repository import DogsRepository
+from age_intervals import age_interval_index, load_breed_age_buckets
+from breed_summary import BreedSummary
+from storage_layout import DOGS_DELETE_ALL_MODE, breed_collection, breed_filter, ensure_breed_indexes, list_breed_names, find_all, find_page, find_by_id, prepare_insert, record_created_many, record_deleted, delete_by_id, delete_all
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+class MongoDogsRepository(DogsRepository):
+    """
+    Dog data stored in MongoDB with the configured storage layout, backed by the
+    in-process age buckets, ID locator, breed catalogue and breed summary.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def list_breeds(self):
+        return list_breed_names(self.db)
+
+    def list_breed_pictures(self):
+        return BreedSummary.list(self.db)
+
+    def find_all(self, batch_size=0, concurrent=False):
+        return find_all(self.db, batch_size, concurrent=concurrent)
+
+    def find_page(self, after=None, limit=0, projection=None, batch_size=0):
+        return find_page(self.db, after, limit, projection, batch_size)
+
+    def get_by_id(self, dog_id):
+        return find_by_id(self.db, dog_id)
+
+    def age_buckets(self, breed_name, genders):
+        # At most one query, none if the genders are already loaded in memory
+        return load_breed_age_buckets(self.db, breed_name, genders)
+
+    def find_overlapping(self, breed_name, dog_data_items):
+        ensure_breed_indexes(self.db, breed_name)
+        # A single query for all the items of the breed
+        return list(breed_collection(self.db, breed_name).find(breed_filter(breed_name, {"$or": [
+            {"gender": dog_data_item['gender'], "from_age": {"$lt": dog_data_item['to_age']}, "to_age": {"$gt": dog_data_item['from_age']}}
+            for dog_data_item in dog_data_items
+        ]}), {"gender": 1, "from_age": 1, "to_age": 1}))
+
+    def insert_many(self, breed_name, dog_data_items):
+        errors = [None] * len(dog_data_items)
+        if not dog_data_items:
+            return errors
+        package_collection = breed_collection(self.db, breed_name)
+        ensure_breed_indexes(self.db, breed_name)
+        prepare_insert(self.db)
+        try:
+            if len(dog_data_items) == 1:
+                package_collection.insert_one(dog_data_items[0])
+            else:
+                package_collection.insert_many(dog_data_items, ordered=False)
+        except BulkWriteError as e:
+            for write_error in e.details.get('writeErrors', []):
+                errors[write_error['index']] = write_error['errmsg']
+
+        inserted_items = [dog_data_item for dog_data_item, error in zip(dog_data_items, errors) if error is None]
+        if inserted_items:
+            record_created_many(self.db, breed_name, inserted_items)
+            BreedSummary.record_created(self.db, inserted_items[0])
+            for dog_data_item in inserted_items:
+                age_interval_index.add(dog_data_item)
+        return errors
+
+    def update(self, breed_name, key, updates):
+        # Update and read back the post-image atomically, with the full (gender, from_age, to_age) filter
+        updated_dog_data = breed_collection(self.db, breed_name).find_one_and_update(
+            breed_filter(breed_name, key),
+            {"$set": updates},
+            return_document=ReturnDocument.AFTER
+        )
+        if updated_dog_data is not None:
+            self.__record_updated(breed_name, [key], [updates])
+        return updated_dog_data
+
+    def update_many(self, breed_name, updates):
+        package_collection = breed_collection(self.db, breed_name)
+        results = [None] * len(updates)
+
+        bulk_updates = []
+        for position, (key, fields, return_document) in enumerate(updates):
+            if return_document:
+                # Write and read back in a single round trip
+                updated_dog_data = package_collection.find_one_and_update(breed_filter(breed_name, key), {"$set": fields}, return_document=ReturnDocument.AFTER)
+                if updated_dog_data:
+                    results[position] = (200, updated_dog_data, None)
+                else:
+                    results[position] = (404, None, "No data found for this breed and age range")
+            else:
+                bulk_updates.append((position, key, fields))
+
+        if bulk_updates:
+            failed_positions = {}
+            try:
+                matched_count = package_collection.bulk_write([UpdateOne(breed_filter(breed_name, key), {"$set": fields}) for _, key, fields in bulk_updates], ordered=False).matched_count
+            except BulkWriteError as e:
+                failed_positions = {write_error['index']: write_error['errmsg'] for write_error in e.details.get('writeErrors', [])}
+                matched_count = e.details.get('nMatched', 0)
+            written_updates = [bulk_update for bulk_position, bulk_update in enumerate(bulk_updates) if bulk_position not in failed_positions]
+            for bulk_position, (position, _, _) in enumerate(bulk_updates):
+                if bulk_position in failed_positions:
+                    results[position] = (500, None, failed_positions[bulk_position])
+            if matched_count == len(written_updates):
+                # Every update matched its dog data, as each one matches at most one
+                for position, _, _ in written_updates:
+                    results[position] = (200, None, None)
+            else:
+                # The bulk result does not tell which updates missed: apply them again one by one, which
+                # leaves the already updated dog data unchanged, and take each status from its own write
+                for position, key, fields in written_updates:
+                    if package_collection.update_one(breed_filter(breed_name, key), {"$set": fields}).matched_count:
+                        results[position] = (200, None, None)
+                    else:
+                        results[position] = (404, None, "No data found for this breed and age range")
+
+        updated = [(key, fields) for (key, fields, _), (status, _, _) in zip(updates, results) if status == 200]
+        if updated:
+            self.__record_updated(breed_name, [key for key, _ in updated], [fields for _, fields in updated])
+        return results
+
+    def delete_by_id(self, dog_id):
+        deleted_dog_data = delete_by_id(self.db, dog_id)
+        if deleted_dog_data:
+            BreedSummary.refresh(self.db, deleted_dog_data['breed_name'])
+            age_interval_index.remove(deleted_dog_data)
+        return deleted_dog_data
+
+    def delete_by_range(self, breed_name, gender, from_age, to_age):
+        deleted_dog_data = breed_collection(self.db, breed_name).find_one_and_delete(breed_filter(breed_name, {"gender": gender, "from_age": from_age, "to_age": to_age}), projection={"_id": 1})
+        if deleted_dog_data:
+            record_deleted(self.db, deleted_dog_data['_id'])
+            BreedSummary.refresh(self.db, breed_name)
+            age_interval_index.remove({"_id": deleted_dog_data['_id'], "breed_name": breed_name, "gender": gender})
+        return deleted_dog_data
+
+    def delete_all(self):
+        delete_all(self.db)
+        BreedSummary.clear(self.db)
+        age_interval_index.clear()
+        return DOGS_DELETE_ALL_MODE
+
+    def __record_updated(self, breed_name, keys, updates):
+        for gender in {key['gender'] for key in keys}:
+            age_interval_index.invalidate(breed_name, gender)
+        if any('pic_url' in fields for fields in updates):
+            BreedSummary.refresh(self.db, breed_name)
@@ -1,11 +1,19 @@
 from dotenv import load_dotenv
+
+# Load the environment variables first, the modules below read their configuration on import
+load_dotenv()
+
+from pymongo import AsyncMongoClient
 from pymongo.mongo_client import MongoClient
 from pymongo.server_api import ServerApi
+from storage_layout import ensure_indexes
+from mongodb_health import database_health
+from cache_invalidation import cache_invalidator, start_cache_invalidation
 
+import asyncio
+import importlib.util
 import os
-
-# Load the environment variables
-load_dotenv()
+import threading
 
 DB_CONNECTION_STRING = os.getenv("DB_CONNECTION_STRING")
 DB_NAME = os.getenv("DB_NAME")
@@ -14,40 +22,239 @@ DB_PASSWORD = os.getenv("DB_PASSWORD")
 
 MONGO_URI = f"mongodb+srv://{DB_USERNAME}:{DB_PASSWORD}@{DB_CONNECTION_STRING}/{DB_NAME}"
 
+# Connection pool, timeouts and wire compression of the MongoClient
+DB_MAX_POOL_SIZE = int(os.getenv("DB_MAX_POOL_SIZE", "50"))
+DB_MIN_POOL_SIZE = int(os.getenv("DB_MIN_POOL_SIZE", "5"))
+DB_MAX_IDLE_TIME_MS = int(os.getenv("DB_MAX_IDLE_TIME_MS", "300000"))
+DB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("DB_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+DB_CONNECT_TIMEOUT_MS = int(os.getenv("DB_CONNECT_TIMEOUT_MS", "5000"))
+DB_SOCKET_TIMEOUT_MS = int(os.getenv("DB_SOCKET_TIMEOUT_MS", "10000"))
+DB_COMPRESSORS = os.getenv("DB_COMPRESSORS", "zstd,snappy,zlib")
+
+# The Python module each wire compressor needs, zlib is always available
+COMPRESSOR_MODULES = {"zstd": "zstandard", "snappy": "snappy", "zlib": "zlib"}
+
+def available_compressors(compressors):
+    """
+    Keep the compressors whose Python module is installed, in order of preference
+
+    :param compressors: Comma separated compressor names
+    :return: Comma separated compressor names
+    :rtype: str
+    """
+    names = [name.strip() for name in compressors.split(",") if name.strip()]
+    return ",".join(name for name in names if name in COMPRESSOR_MODULES and importlib.util.find_spec(COMPRESSOR_MODULES[name]) is not None)
+
+def client_options():
+    """
+    Build the MongoClient options from the environment
+
+    :return: The keyword arguments of MongoClient
+    :rtype: dict
+    """
+    options = {
+        "maxPoolSize": DB_MAX_POOL_SIZE,
+        "minPoolSize": DB_MIN_POOL_SIZE,
+        "maxIdleTimeMS": DB_MAX_IDLE_TIME_MS,
+        "serverSelectionTimeoutMS": DB_SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": DB_CONNECT_TIMEOUT_MS,
+        "socketTimeoutMS": DB_SOCKET_TIMEOUT_MS
+    }
+    compressors = available_compressors(DB_COMPRESSORS)
+    if compressors:
+        options["compressors"] = compressors
+    return options
+
 class MongoConnectionHolder:
+    """
+    Holds the MongoClient of the current process.
+
+    MongoClient is not fork-safe, so the client is created lazily by each process on
+    first use: a client inherited from a parent process (e.g. a gunicorn master
+    started with --preload) is discarded and a new one is built in the worker.
+    """
     __db = None
+    __pid = None
+    __lock = threading.Lock()
 
     @staticmethod
-    def initialize_db():
+    def connect():
         """
-        Initialize the database connection
+        Create the MongoClient of the current process
 
         :return: MongoDB connection
         :rtype: Database
         """
-        if MongoConnectionHolder.__db is None:
+        # MongoClient connects in the background, so creating it does not wait for the server.
+        # It still raises on a malformed URI, and resolves mongodb+srv URIs before returning.
+        options = client_options()
+        print(f"Connecting to MongoDB from process {os.getpid()} with {options}")
+        client = MongoClient(MONGO_URI, server_api=ServerApi('1'), **options)
+        return client[DB_NAME]
+
+    @staticmethod
+    def initialize_db():
+        """
+        Initialize the database connection of the current process, once. If the client
+        cannot be created the circuit opens and the health checker keeps trying to create
+        it with backoff, off the request path.
+
+        :return: MongoDB connection, or None if the client could not be created yet
+        :rtype: Database
+        """
+        if MongoConnectionHolder.__pid == os.getpid():
+            return MongoConnectionHolder.__db
+
+        with MongoConnectionHolder.__lock:
+            if MongoConnectionHolder.__pid == os.getpid():
+                return MongoConnectionHolder.__db
+            # Never use (nor close) a client inherited from the parent process, its sockets are shared with it
+            MongoConnectionHolder.__db = None
             try:
-                # Create a new client and connect to the server
-                client = MongoClient(MONGO_URI, server_api=ServerApi('1'))
-
-                # Send a ping to confirm a successful connection
-                client.admin.command('ping')
-                print("Pinged your deployment. You successfully connected to MongoDB!")
-                
-                MongoConnectionHolder.__db = client[DB_NAME]
+                MongoConnectionHolder.__db = MongoConnectionHolder.connect()
             except Exception as e:
                 print(e)
+                database_health.open_circuit(e)
+
+            def ping():
+                if MongoConnectionHolder.__db is None:
+                    MongoConnectionHolder.__db = MongoConnectionHolder.connect()
+                MongoConnectionHolder.__db.client.admin.command('ping')
+
+            def on_connected():
+                ensure_indexes(MongoConnectionHolder.__db)
+                start_cache_invalidation(MongoConnectionHolder.__db)
+
+            # The health checker pings the server off the request path, then creates the indexes
+            # and starts watching the writes of the other processes once it answers
+            database_health.start(ping, on_connected)
+            MongoConnectionHolder.__pid = os.getpid()
         return MongoConnectionHolder.__db
 
+    @staticmethod
+    def is_initialized():
+        """
+        Check whether the current process already initialized its database connection,
+        after which get_db never blocks
+
+        :rtype: bool
+        """
+        return MongoConnectionHolder.__pid == os.getpid()
+
     @staticmethod
     def get_db():
         """
-        Get the database connection
+        Get the database connection of the current process
 
-        :return: MongoDB connection
+        :return: MongoDB connection, or None while MongoDB is unavailable
         :rtype: Database
         """
-        if MongoConnectionHolder.__db is None:
+        if MongoConnectionHolder.__pid != os.getpid():
             MongoConnectionHolder.initialize_db()
 
-        return MongoConnectionHolder.__db
\ No newline at end of file
+        # Fail fast while the circuit is open instead of waiting for the server selection timeout
+        # (or creating the client again on every request)
+        if not database_health.is_available():
+            return None
+        return MongoConnectionHolder.__db
+
+    @staticmethod
+    def _reset_after_fork():
+        # The parent's lock may have been held by another thread at fork time
+        MongoConnectionHolder.__lock = threading.Lock()
+        MongoConnectionHolder.__db = None
+        MongoConnectionHolder.__pid = None
+        # The health checker and change stream threads do not survive the fork
+        database_health.reset()
+        cache_invalidator.reset()
+
+class AsyncMongoConnectionHolder:
+    """
+    Holds the AsyncMongoClient used by the ASGI app of the current process.
+
+    An AsyncMongoClient is bound to the event loop it is first used on, so it is
+    created lazily for the serving loop and closed when the app stops serving.
+    Creating a client resolves mongodb+srv URIs with blocking DNS queries, so both
+    clients are created in a thread, off the event loop.
+    Availability is shared with the synchronous client: its health checker
+    (see mongodb_health) also opens the circuit for the async requests.
+    """
+    __db = None
+    __client = None
+    # The creation in progress, awaited by every request arriving meanwhile
+    __connecting = None
+
+    @staticmethod
+    async def connect():
+        """
+        Create the async client of the current process, off the event loop, unless it
+        exists or the synchronous client could not be created yet
+        """
+        if AsyncMongoConnectionHolder.__db is not None:
+            return
+        if MongoConnectionHolder.is_initialized() and MongoConnectionHolder.get_db() is None:
+            # The health checker keeps retrying, nothing to create before it succeeds
+            return
+        if AsyncMongoConnectionHolder.__connecting is None:
+            AsyncMongoConnectionHolder.__connecting = asyncio.get_running_loop().run_in_executor(None, AsyncMongoConnectionHolder.__create_client)
+        connecting = AsyncMongoConnectionHolder.__connecting
+        try:
+            # A cancelled request must not cancel the creation awaited by the others
+            client = await asyncio.shield(connecting)
+        finally:
+            if AsyncMongoConnectionHolder.__connecting is connecting:
+                AsyncMongoConnectionHolder.__connecting = None
+        if client is not None and AsyncMongoConnectionHolder.__db is None:
+            AsyncMongoConnectionHolder.__client = client
+            AsyncMongoConnectionHolder.__db = client[DB_NAME]
+
+    @staticmethod
+    async def get_db():
+        """
+        Get the async database connection of the current process
+
+        :return: Async MongoDB connection, or None while MongoDB is unavailable
+        :rtype: AsyncDatabase
+        """
+        await AsyncMongoConnectionHolder.connect()
+        # Never blocks once connect() initialized the synchronous client
+        if MongoConnectionHolder.get_db() is None:
+            return None
+        return AsyncMongoConnectionHolder.__db
+
+    @staticmethod
+    def __create_client():
+        # Starts the health checker (and creates the indexes) on first use
+        if MongoConnectionHolder.initialize_db() is None:
+            return None
+        try:
+            options = client_options()
+            print(f"Connecting to MongoDB asynchronously from process {os.getpid()} with {options}")
+            return AsyncMongoClient(MONGO_URI, server_api=ServerApi('1'), **options)
+        except Exception as e:
+            print(e)
+            return None
+
+    @staticmethod
+    async def close():
+        """
+        Close the async client of the current process, e.g. when the ASGI app stops serving
+        """
+        client = AsyncMongoConnectionHolder.__client
+        AsyncMongoConnectionHolder.__client = None
+        AsyncMongoConnectionHolder.__db = None
+        if client is not None:
+            await client.close()
+
+    @staticmethod
+    def _reset_after_fork():
+        AsyncMongoConnectionHolder.__client = None
+        AsyncMongoConnectionHolder.__db = None
+        AsyncMongoConnectionHolder.__connecting = None
+
+def _reset_after_fork():
+    MongoConnectionHolder._reset_after_fork()
+    AsyncMongoConnectionHolder._reset_after_fork()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
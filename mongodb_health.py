@@ -0,0 +1,174 @@
+import os
+import random
+import threading
+import time
+
+DB_HEALTH_CHECK_INTERVAL_SECONDS = float(os.getenv("DB_HEALTH_CHECK_INTERVAL_SECONDS", "10"))
+DB_HEALTH_FAILURE_THRESHOLD = int(os.getenv("DB_HEALTH_FAILURE_THRESHOLD", "2"))
+DB_HEALTH_BACKOFF_BASE_SECONDS = float(os.getenv("DB_HEALTH_BACKOFF_BASE_SECONDS", "1"))
+DB_HEALTH_BACKOFF_MAX_SECONDS = float(os.getenv("DB_HEALTH_BACKOFF_MAX_SECONDS", "30"))
+
+# Requests go to MongoDB
+CIRCUIT_CLOSED = "closed"
+# MongoDB is down, requests fail fast until a health check succeeds
+CIRCUIT_OPEN = "open"
+
+class DatabaseHealth:
+    """
+    Circuit breaker in front of MongoDB, driven by a background health checker.
+
+    The checker pings MongoDB every check_interval_seconds. After failure_threshold
+    consecutive failed pings the circuit opens and requests fail fast instead of
+    waiting for the server selection timeout; the checker then retries with
+    exponential backoff (with jitter) and closes the circuit on the first successful ping.
+    The circuit starts closed, so the first requests never wait for a ping.
+    """
+
+    def __init__(self, check_interval_seconds=DB_HEALTH_CHECK_INTERVAL_SECONDS, failure_threshold=DB_HEALTH_FAILURE_THRESHOLD,
+                 backoff_base_seconds=DB_HEALTH_BACKOFF_BASE_SECONDS, backoff_max_seconds=DB_HEALTH_BACKOFF_MAX_SECONDS):
+        self.check_interval_seconds = check_interval_seconds
+        self.failure_threshold = max(1, failure_threshold)
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the health state and the checker thread, e.g. in a forked child process
+        """
+        self.__lock = threading.Lock()
+        self.__stop = threading.Event()
+        self.__thread = None
+        self.__state = CIRCUIT_CLOSED
+        self.__consecutive_failures = 0
+        self.__next_check_at = None
+        self.__last_error = None
+
+    def start(self, ping, on_first_success=None):
+        """
+        Start the background health checker of this process, once
+
+        :param ping: Callable sending a ping to MongoDB, raises on failure
+        :param on_first_success: Callable run by the checker after the first successful ping
+        """
+        with self.__lock:
+            if self.__thread is not None:
+                return
+            self.__thread = threading.Thread(target=self.__run, args=(ping, on_first_success), name="mongodb-health-check", daemon=True)
+            self.__thread.start()
+
+    def stop(self):
+        """
+        Stop the background health checker
+        """
+        self.__stop.set()
+
+    def is_available(self):
+        """
+        Check whether requests may be sent to MongoDB
+
+        :rtype: bool
+        """
+        with self.__lock:
+            return self.__state == CIRCUIT_CLOSED
+
+    def retry_after(self):
+        """
+        Get the number of seconds until the next health check, to tell clients when to retry
+
+        :rtype: int
+        """
+        with self.__lock:
+            next_check_at = self.__next_check_at
+        if next_check_at is None:
+            return 1
+        return max(1, int(next_check_at - time.monotonic() + 0.999))
+
+    def record_success(self):
+        """
+        Record a successful health check, closing the circuit
+        """
+        with self.__lock:
+            if self.__state == CIRCUIT_OPEN:
+                print("MongoDB is reachable again, closing the circuit")
+            self.__state = CIRCUIT_CLOSED
+            self.__consecutive_failures = 0
+            self.__last_error = None
+
+    def record_failure(self, error):
+        """
+        Record a failed health check, opening the circuit once failure_threshold is reached
+
+        :param error: The exception raised by the health check
+        """
+        with self.__lock:
+            self.__consecutive_failures += 1
+            self.__last_error = str(error)
+            if self.__state == CIRCUIT_CLOSED and self.__consecutive_failures >= self.failure_threshold:
+                print(f"MongoDB is unreachable, opening the circuit: {error}")
+                self.__state = CIRCUIT_OPEN
+
+    def open_circuit(self, error):
+        """
+        Open the circuit at once, e.g. when the client cannot even be created, so requests
+        fail fast until the health checker succeeds
+
+        :param error: The exception raised while connecting
+        """
+        with self.__lock:
+            print(f"MongoDB is unreachable, opening the circuit: {error}")
+            self.__state = CIRCUIT_OPEN
+            self.__consecutive_failures = max(self.__consecutive_failures, self.failure_threshold)
+            self.__last_error = str(error)
+
+    def backoff_seconds(self):
+        """
+        Get the delay before the next health check: the check interval while the circuit
+        is closed, an exponential backoff with jitter while it is open
+
+        :rtype: float
+        """
+        with self.__lock:
+            if self.__state == CIRCUIT_CLOSED:
+                return self.check_interval_seconds
+            retries = self.__consecutive_failures - self.failure_threshold
+        delay = min(self.backoff_max_seconds, self.backoff_base_seconds * 2 ** min(retries, 32))
+        # Full jitter keeps the workers of a deployment from retrying in lockstep
+        return random.uniform(delay / 2, delay)
+
+    def stats(self):
+        """
+        Get the state of the circuit
+
+        :rtype: dict
+        """
+        with self.__lock:
+            return {
+                "state": self.__state,
+                "consecutive_failures": self.__consecutive_failures,
+                "last_error": self.__last_error
+            }
+
+    def __run(self, ping, on_first_success):
+        succeeded_once = False
+        while not self.__stop.is_set():
+            try:
+                ping()
+                self.record_success()
+            except Exception as e:
+                self.record_failure(e)
+            else:
+                if not succeeded_once and on_first_success is not None:
+                    try:
+                        on_first_success()
+                        succeeded_once = True
+                    except Exception as e:
+                        print(e)
+
+            delay = self.backoff_seconds()
+            with self.__lock:
+                self.__next_check_at = time.monotonic() + delay
+            self.__stop.wait(delay)
+
+# Health of the MongoDB connection of this process
+database_health = DatabaseHealth()
@@ -1,6 +1,12 @@
 from flask import request, jsonify, Blueprint
 from mongodb_connection_manager import MongoConnectionHolder
+from storage_layout import breed_collection, breed_filter, ensure_breed_indexes, ensure_indexes, prepare_insert, record_created_many
+from breed_summary import BreedSummary
+from pymongo import UpdateOne
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+import os
+import time
 import uuid
 
 
@@ -1601,23 +1607,72 @@ French_Bulldog_Female,
 Poodle_Male,
 Poodle_Female]
 
+# Number of breeds seeded concurrently
+SEED_WORKERS = int(os.getenv("DOGS_SEED_WORKERS", "8"))
+
+def seed_breed(db, breed_name, documents):
+    """
+    Upsert the mock data of one breed with a single bulk write. Documents are keyed on
+    (breed, gender, from_age, to_age), so re-running the seed updates them in place
+    instead of inserting duplicates.
+
+    :param db: MongoDB database
+    :param breed_name: The name of the breed
+    :param documents: The mock dog data of the breed
+    :return: (number of inserted documents, number of updated documents)
+    :rtype: tuple
+    """
+    collection = breed_collection(db, breed_name)
+    ensure_breed_indexes(db, breed_name)
+    prepare_insert(db)
+    now = datetime.now()
+    operations = [
+        UpdateOne(
+            breed_filter(breed_name, {"gender": data["gender"], "from_age": data["from_age"], "to_age": data["to_age"]}),
+            {"$set": {**data, "updated_at": now}, "$setOnInsert": {"_id": str(uuid.uuid4()), "created_at": now}},
+            upsert=True
+        )
+        for data in documents
+    ]
+    result = collection.bulk_write(operations, ordered=False)
+
+    inserted_items = [{**documents[index], "_id": dog_id} for index, dog_id in result.upserted_ids.items()]
+    if inserted_items:
+        record_created_many(db, breed_name, inserted_items)
+        BreedSummary.record_created(db, inserted_items[0])
+    return len(inserted_items), result.modified_count
+
 def populate_db():
-    db = db = MongoConnectionHolder.get_db()
+    db = MongoConnectionHolder.get_db()
     if db is None:
         print("Failed to connect to the database")
         return
+    ensure_indexes(db)
+
+    documents_by_breed = {}
     for mock in mock_data:
         for data in mock:
-            collection_name = data['breed_name']
-            collection = db[collection_name]
-            data["_id"] = str(uuid.uuid4())
-            data["created_at"] = datetime.now()
-            data["updated_at"] = datetime.now()
+            documents_by_breed.setdefault(data['breed_name'], []).append(data)
+
+    start = time.perf_counter()
+    inserted = updated = failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, min(SEED_WORKERS, len(documents_by_breed)))) as executor:
+        futures = {executor.submit(seed_breed, db, breed_name, documents): breed_name for breed_name, documents in documents_by_breed.items()}
+        for future in as_completed(futures):
+            breed_name = futures[future]
             try:
-                collection.insert_one(data)
-                print(f"Inserted data for {data['breed_name']} ({data['gender']})")
+                breed_inserted, breed_updated = future.result()
+                inserted += breed_inserted
+                updated += breed_updated
+                print(f"Seeded {breed_name}: {breed_inserted} inserted, {breed_updated} updated")
             except Exception as e:
-                print(f"Error inserting data for {data['breed_name']}: {e}")
+                failed += len(documents_by_breed[breed_name])
+                print(f"Error seeding data for {breed_name}: {e}")
+
+    elapsed = time.perf_counter() - start
+    total = sum(len(documents) for documents in documents_by_breed.values())
+    print(f"Seeded {total} documents of {len(documents_by_breed)} breeds in {elapsed:.2f}s "
+          f"({total / elapsed if elapsed else 0:.0f} docs/s): {inserted} inserted, {updated} updated, {failed} failed")
 
 if __name__ == "__main__":
-    populate_db()
\ No newline at end of file
+    populate_db()
@@ -0,0 +1,146 @@
+from dogs_repository import DogsRepository, ReadOnlyRepositoryError
+from age_intervals import AgeBuckets
+from dogs_snapshot import DogsSnapshot
+from storage_layout import PAGE_SORT_KEYS
+import os
+import threading
+import time
+
+# The snapshot file served by the snapshot backend, see dogs_snapshot.py to export one
+DOGS_SNAPSHOT_FILE = os.getenv("DOGS_SNAPSHOT_FILE")
+# How often the snapshot file is checked for a new version
+DOGS_SNAPSHOT_RELOAD_INTERVAL_SECONDS = float(os.getenv("DOGS_SNAPSHOT_RELOAD_INTERVAL_SECONDS", "5"))
+
+class SnapshotAgeBuckets(AgeBuckets):
+    """
+    Age buckets over the index keys of snapshot records, decoding the record that is found
+    """
+
+    def __init__(self, snapshot, keys):
+        super().__init__(keys)
+        self.snapshot = snapshot
+
+    def find_containing(self, age):
+        return self.__decode(super().find_containing(age))
+
+    def find_exact(self, from_age, to_age):
+        return self.__decode(super().find_exact(from_age, to_age))
+
+    def find_overlapping(self, from_age, to_age):
+        return self.__decode(super().find_overlapping(from_age, to_age))
+
+    def __decode(self, key):
+        return self.snapshot.record(key['_record']) if key is not None else None
+
+class SnapshotIndex:
+    """
+    A loaded snapshot with its indexes by UUID, by breed and by (breed, gender, age)
+    """
+
+    def __init__(self, path):
+        self.snapshot = DogsSnapshot(path)
+        self.records_by_id = {}
+        self.records_by_breed = {}
+        keys_by_gender = {}
+        for index in range(self.snapshot.count):
+            key = self.snapshot.key(index)
+            self.records_by_id[key['_id']] = index
+            self.records_by_breed.setdefault(key['breed_name'], []).append(index)
+            keys_by_gender.setdefault((key['breed_name'], key['gender']), []).append(key)
+        self.buckets = {breed_gender: SnapshotAgeBuckets(self.snapshot, keys) for breed_gender, keys in keys_by_gender.items()}
+        self.breed_names = sorted(self.records_by_breed)
+
+class SnapshotDogsRepository(DogsRepository):
+    """
+    Read-only dog data served from a snapshot file mapped in memory, without any database.
+    The file is reloaded when it changes (it is replaced atomically by the export), checked
+    at most every reload_interval_seconds.
+    """
+
+    def __init__(self, path, reload_interval_seconds=DOGS_SNAPSHOT_RELOAD_INTERVAL_SECONDS):
+        self.path = path
+        self.reload_interval_seconds = reload_interval_seconds
+        self.__lock = threading.Lock()
+        self.__version = self.__file_version()
+        self.__index = SnapshotIndex(path)
+        self.__checked_at = time.monotonic()
+
+    def reload_if_changed(self):
+        """
+        Load the snapshot file again if it was replaced since it was loaded
+
+        :return: Whether a new snapshot was loaded
+        :rtype: bool
+        """
+        if self.__checked_at + self.reload_interval_seconds > time.monotonic():
+            return False
+        with self.__lock:
+            if self.__checked_at + self.reload_interval_seconds > time.monotonic():
+                return False
+            self.__checked_at = time.monotonic()
+            try:
+                version = self.__file_version()
+                if version == self.__version:
+                    return False
+                # Requests in flight keep the previous snapshot, it is unmapped once they release it
+                self.__index = SnapshotIndex(self.path)
+                self.__version = version
+            except Exception as e:
+                print(f"Keeping the current snapshot, {self.path} could not be loaded: {e}")
+                return False
+        print(f"Loaded the snapshot {self.path} with {self.__index.snapshot.count} dog data items")
+        return True
+
+    def list_breeds(self):
+        return list(self.__index.breed_names)
+
+    def list_breed_pictures(self):
+        index = self.__index
+        return [{"breed_name": breed_name, "pic_url": index.snapshot.record(index.records_by_breed[breed_name][0]).get('pic_url')} for breed_name in index.breed_names]
+
+    def find_all(self, batch_size=0, concurrent=False):
+        index = self.__index
+        for breed_name in index.breed_names:
+            for record in index.records_by_breed[breed_name]:
+                yield index.snapshot.record(record)
+
+    def find_page(self, after=None, limit=0, projection=None, batch_size=0):
+        dogs_data = sorted(self.find_all(), key=lambda dog_data: [dog_data[key] for key in PAGE_SORT_KEYS])
+        if after:
+            dogs_data = [dog_data for dog_data in dogs_data if [dog_data[key] for key in PAGE_SORT_KEYS] > list(after)]
+        return iter(dogs_data[:limit] if limit else dogs_data)
+
+    def get_by_id(self, dog_id):
+        index = self.__index
+        record = index.records_by_id.get(dog_id)
+        return index.snapshot.record(record) if record is not None else None
+
+    def age_buckets(self, breed_name, genders):
+        index = self.__index
+        return {gender: index.buckets.get((breed_name, gender)) or AgeBuckets([]) for gender in genders}
+
+    def insert_many(self, breed_name, dog_data_items):
+        self.__reject_write()
+
+    def update(self, breed_name, key, updates):
+        self.__reject_write()
+
+    def update_many(self, breed_name, updates):
+        self.__reject_write()
+
+    def delete_by_id(self, dog_id):
+        self.__reject_write()
+
+    def delete_by_range(self, breed_name, gender, from_age, to_age):
+        self.__reject_write()
+
+    def delete_all(self):
+        self.__reject_write()
+
+    def __reject_write(self):
+        # The write endpoints are rejected before reaching the repository, this is the last line of defence
+        raise ReadOnlyRepositoryError(f"The snapshot {self.path} is read-only")
+
+    def __file_version(self):
+        stat = os.stat(self.path)
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
@@ -0,0 +1,58 @@
+from mongodb_connection_manager import MongoConnectionHolder
+from mongo_dogs_repository import MongoDogsRepository
+from memory_dogs_repository import memory_dogs_repository
+from snapshot_dogs_repository import DOGS_SNAPSHOT_FILE, SnapshotDogsRepository
+from dogs_cache import breed_lookup_cache
+from conditional_requests import data_versions
+import os
+
+# Every dog data item is stored in MongoDB, laid out as configured by DOGS_STORAGE_LAYOUT
+MONGODB_BACKEND = "mongodb"
+# Every dog data item is held in the memory of the process, nothing is persisted
+MEMORY_BACKEND = "memory"
+# Every dog data item is read from a snapshot file mapped in memory, the API is read-only
+SNAPSHOT_BACKEND = "snapshot"
+STORAGE_BACKENDS = [MONGODB_BACKEND, MEMORY_BACKEND, SNAPSHOT_BACKEND]
+
+DOGS_STORAGE_BACKEND = os.getenv("DOGS_STORAGE_BACKEND", MONGODB_BACKEND)
+if DOGS_STORAGE_BACKEND not in STORAGE_BACKENDS:
+    raise ValueError(f"DOGS_STORAGE_BACKEND must be one of {STORAGE_BACKENDS}, got '{DOGS_STORAGE_BACKEND}'")
+
+snapshot_dogs_repository = None
+if DOGS_STORAGE_BACKEND == SNAPSHOT_BACKEND:
+    if not DOGS_SNAPSHOT_FILE:
+        raise ValueError("DOGS_SNAPSHOT_FILE must be set when DOGS_STORAGE_BACKEND is 'snapshot'")
+    snapshot_dogs_repository = SnapshotDogsRepository(DOGS_SNAPSHOT_FILE)
+
+def is_read_only_backend():
+    """
+    Check whether the configured storage backend rejects writes
+
+    :rtype: bool
+    """
+    return DOGS_STORAGE_BACKEND == SNAPSHOT_BACKEND
+
+def refresh_storage_backend():
+    """
+    Pick up a new version of the snapshot file, dropping the responses cached for the previous one
+    """
+    if snapshot_dogs_repository is not None and snapshot_dogs_repository.reload_if_changed():
+        breed_lookup_cache.clear()
+        data_versions.bump()
+
+def get_dogs_repository():
+    """
+    Get the repository of the configured storage backend
+
+    :return: The repository, or None while its database is unavailable
+    :rtype: DogsRepository
+    """
+    if DOGS_STORAGE_BACKEND == MEMORY_BACKEND:
+        return memory_dogs_repository
+    if DOGS_STORAGE_BACKEND == SNAPSHOT_BACKEND:
+        return snapshot_dogs_repository
+
+    db = MongoConnectionHolder.get_db()
+    if db is None:
+        return None
+    return MongoDogsRepository(db)
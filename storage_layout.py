@@ -0,0 +1,480 @@
+from dogs_id_locator import DogIdLocator, ID_LOCATOR_COLLECTION
+from breed_catalogue import breed_catalogue
+from fanout_executor import fanout_executor
+import os
+import threading
+import time
+
+# Every breed is stored in its own collection named after the breed
+PER_BREED_LAYOUT = "per_breed"
+# Every breed is stored in the single DOGS_DATA_COLLECTION collection
+SINGLE_COLLECTION_LAYOUT = "single_collection"
+STORAGE_LAYOUTS = [PER_BREED_LAYOUT, SINGLE_COLLECTION_LAYOUT]
+
+STORAGE_LAYOUT = os.getenv("DOGS_STORAGE_LAYOUT", PER_BREED_LAYOUT)
+if STORAGE_LAYOUT not in STORAGE_LAYOUTS:
+    raise ValueError(f"DOGS_STORAGE_LAYOUT must be one of {STORAGE_LAYOUTS}, got '{STORAGE_LAYOUT}'")
+
+# Whether a lookup by ID missing from the ID locator scans every breed collection (e.g. for
+# records inserted without going through the API) instead of answering not found
+DOGS_ID_LOCATOR_FALLBACK_SCAN = os.getenv("DOGS_ID_LOCATOR_FALLBACK_SCAN", "false").lower() == "true"
+
+DOGS_DATA_COLLECTION = "dogs_data"
+# Collection holding one {"_id": <breed>, "pic_url": <url>} document per breed
+BREED_SUMMARY_COLLECTION = "_dogs_breed_summary"
+# Collection holding the last change stream resume token of every cache invalidation consumer
+CHANGE_STREAM_CHECKPOINT_COLLECTION = "_dogs_change_stream_checkpoints"
+
+# Collections used internally by the API that do not hold breed data
+INTERNAL_COLLECTIONS = {ID_LOCATOR_COLLECTION, DOGS_DATA_COLLECTION, BREED_SUMMARY_COLLECTION, CHANGE_STREAM_CHECKPOINT_COLLECTION}
+
+# The longest breed name stored as a collection name: a namespace ("<database>.<collection>")
+# holds at most 255 bytes and a database name at most 64
+MAX_BREED_COLLECTION_NAME_BYTES = 255 - 64 - 1
+
+# Drop the breed collections concurrently, other collections of the database survive
+DROP_COLLECTIONS_MODE = "drop_collections"
+# Drop the whole database in a single command, the fastest reset when it only holds the API's data
+DROP_DATABASE_MODE = "drop_database"
+# Empty the collections with delete_many and keep them with their indexes, for test environments
+TRUNCATE_MODE = "truncate"
+DELETE_ALL_MODES = [DROP_COLLECTIONS_MODE, DROP_DATABASE_MODE, TRUNCATE_MODE]
+
+# Modes that wipe more than the breed collections or keep emptied breeds listed, for a disposable test
+# database only: DELETE /dogs_data is unauthenticated, so they are refused unless DOGS_TEST_ENVIRONMENT is set
+TEST_ONLY_DELETE_ALL_MODES = [DROP_DATABASE_MODE, TRUNCATE_MODE]
+DOGS_TEST_ENVIRONMENT = os.getenv("DOGS_TEST_ENVIRONMENT", "false").lower() == "true"
+
+DOGS_DELETE_ALL_MODE = os.getenv("DOGS_DELETE_ALL_MODE", DROP_COLLECTIONS_MODE)
+if DOGS_DELETE_ALL_MODE not in DELETE_ALL_MODES:
+    raise ValueError(f"DOGS_DELETE_ALL_MODE must be one of {DELETE_ALL_MODES}, got '{DOGS_DELETE_ALL_MODE}'")
+if DOGS_DELETE_ALL_MODE in TEST_ONLY_DELETE_ALL_MODES and not DOGS_TEST_ENVIRONMENT:
+    raise ValueError(f"DOGS_DELETE_ALL_MODE '{DOGS_DELETE_ALL_MODE}' is only allowed in a test environment, set DOGS_TEST_ENVIRONMENT=true to use it")
+
+# Serves the age lookups and the overlap check, which filter on gender and an age range
+AGE_INDEX_KEYS = [("gender", 1), ("from_age", 1), ("to_age", 1)]
+
+# The keyset order used to page through every dog data item
+PAGE_SORT_KEYS = ["breed_name", "gender", "from_age", "_id"]
+
+# When this process last ensured the indexes of a breed collection. Another process may drop
+# the collection, so the indexes are ensured again once the breed catalogue would be reloaded.
+_indexed_breeds = {}
+_indexed_breeds_lock = threading.Lock()
+
+def is_single_collection(layout=STORAGE_LAYOUT):
+    """
+    Check whether the given layout stores every breed in one collection
+
+    :param layout: The storage layout
+    :rtype: bool
+    """
+    return layout == SINGLE_COLLECTION_LAYOUT
+
+def breed_collection(db, breed_name, layout=STORAGE_LAYOUT):
+    """
+    Get the collection that stores the given breed
+
+    :param db: MongoDB database
+    :param breed_name: The name of the breed
+    :param layout: The storage layout
+    :rtype: Collection
+    """
+    if is_single_collection(layout):
+        return db[DOGS_DATA_COLLECTION]
+    return db[breed_name]
+
+def breed_filter(breed_name, criteria, layout=STORAGE_LAYOUT):
+    """
+    Scope a query to the given breed
+
+    :param breed_name: The name of the breed
+    :param criteria: The query on the breed's dog data
+    :param layout: The storage layout
+    :return: The query to run against breed_collection(db, breed_name)
+    :rtype: dict
+    """
+    if is_single_collection(layout):
+        return {"breed_name": breed_name, **criteria}
+    return criteria
+
+def breed_name_error(breed_name, layout=STORAGE_LAYOUT):
+    """
+    Check that a breed name can be stored in the layout. In the per-breed layout the name
+    is a collection name, which must be valid and must not be one of INTERNAL_COLLECTIONS.
+
+    :param breed_name: The name of the breed
+    :param layout: The storage layout
+    :return: The error message, or None if the breed name is valid
+    :rtype: str
+    """
+    if not isinstance(breed_name, str) or not breed_name:
+        return "'breed_name' must be a non-empty string"
+    if is_single_collection(layout):
+        return None
+    if breed_name in INTERNAL_COLLECTIONS:
+        return f"'{breed_name}' is reserved"
+    if '$' in breed_name or '\0' in breed_name or '..' in breed_name or breed_name.startswith(('.', 'system.')) or breed_name.endswith('.'):
+        return "'breed_name' must not contain '$', '..' or null characters, start with '.' or 'system.' or end with '.'"
+    if len(breed_name.encode()) > MAX_BREED_COLLECTION_NAME_BYTES:
+        return f"'breed_name' must be at most {MAX_BREED_COLLECTION_NAME_BYTES} bytes long"
+    return None
+
+def is_breed_collection(name, layout=STORAGE_LAYOUT):
+    """
+    Check whether a collection name holds a breed in the per-breed layout
+
+    :param name: The collection name
+    :param layout: The storage layout
+    :rtype: bool
+    """
+    return is_single_collection(layout) or name not in INTERNAL_COLLECTIONS
+
+def cached_breed_names(layout=STORAGE_LAYOUT):
+    """
+    Get the breed names from the breed catalogue, which only holds those of the configured layout
+
+    :param layout: The storage layout
+    :return: The breed names, or None if they must be loaded from the database
+    :rtype: list
+    """
+    return breed_catalogue.get() if layout == STORAGE_LAYOUT else None
+
+def catalogue_breed_names(names, layout=STORAGE_LAYOUT):
+    """
+    Turn the names loaded from the database into the breed names, and cache them in the
+    breed catalogue for the configured layout
+
+    :param names: The distinct breed names (single collection layout) or the collection names (per-breed layout)
+    :param layout: The storage layout
+    :return: The sorted breed names
+    :rtype: list
+    """
+    if not is_single_collection(layout):
+        names = [name for name in names if is_breed_collection(name, layout)]
+    breed_names = sorted(names)
+    if layout == STORAGE_LAYOUT:
+        breed_catalogue.set(breed_names)
+        if not is_single_collection(layout):
+            # Breeds dropped by another process get their indexes again with their collection
+            with _indexed_breeds_lock:
+                for breed_name in set(_indexed_breeds) - set(breed_names):
+                    del _indexed_breeds[breed_name]
+    return breed_names
+
+def list_breed_names(db, layout=STORAGE_LAYOUT):
+    """
+    List the names of the stored breeds, served from the breed catalogue for the configured layout
+
+    :param db: MongoDB database
+    :param layout: The storage layout
+    :return: The breed names
+    :rtype: list
+    """
+    breed_names = cached_breed_names(layout)
+    if breed_names is not None:
+        return breed_names
+    if is_single_collection(layout):
+        return catalogue_breed_names(db[DOGS_DATA_COLLECTION].distinct("breed_name"), layout)
+    return catalogue_breed_names(db.list_collection_names(), layout)
+
+def ensure_indexes(db, layout=STORAGE_LAYOUT):
+    """
+    Create the indexes required by the storage layout
+
+    :param db: MongoDB database
+    :param layout: The storage layout
+    """
+    if is_single_collection(layout):
+        db[DOGS_DATA_COLLECTION].create_index([("breed_name", 1)] + AGE_INDEX_KEYS)
+        db[DOGS_DATA_COLLECTION].create_index([(key, 1) for key in PAGE_SORT_KEYS])
+    else:
+        for breed in list_breed_names(db, layout):
+            ensure_breed_indexes(db, breed, layout)
+        DogIdLocator.ensure_ready(db, list_breed_names)
+
+def ensure_breed_indexes(db, breed_name, layout=STORAGE_LAYOUT):
+    """
+    Create the age index of a breed collection, at most once per breed catalogue TTL.
+    Creating the index also creates the collection if it does not exist yet.
+
+    :param db: MongoDB database
+    :param breed_name: The name of the breed
+    :param layout: The storage layout
+    """
+    if is_single_collection(layout):
+        return
+    with _indexed_breeds_lock:
+        indexed_at = _indexed_breeds.get(breed_name)
+        if indexed_at is not None and indexed_at + breed_catalogue.ttl_seconds > time.monotonic():
+            return
+    db[breed_name].create_index(AGE_INDEX_KEYS)
+    with _indexed_breeds_lock:
+        _indexed_breeds[breed_name] = time.monotonic()
+
+def forget_breed_indexes(breed_name=None):
+    """
+    Forget that the indexes of a breed collection were ensured, e.g. when another process
+    dropped it, so they are created again with the collection
+
+    :param breed_name: The name of the breed, None for every breed
+    """
+    with _indexed_breeds_lock:
+        if breed_name is None:
+            _indexed_breeds.clear()
+        else:
+            _indexed_breeds.pop(breed_name, None)
+
+def find_all(db, batch_size=0, layout=STORAGE_LAYOUT, concurrent=False):
+    """
+    Iterate over every stored dog data item
+
+    :param db: MongoDB database
+    :param batch_size: The cursor batch size, 0 for the server default
+    :param layout: The storage layout
+    :param concurrent: Whether to read every breed collection at once with the fan-out executor.
+                       Faster, but every item is held in memory before the first one is yielded.
+    :return: Generator of dog data documents, grouped by breed in breed name order
+    """
+    if is_single_collection(layout):
+        yield from db[DOGS_DATA_COLLECTION].find(batch_size=batch_size)
+        return
+    breed_names = list_breed_names(db, layout)
+    if concurrent:
+        for dogs_data in fanout_executor.map(lambda breed: list(db[breed].find(batch_size=batch_size)), breed_names):
+            yield from dogs_data
+        return
+    for breed in breed_names:
+        yield from db[breed].find(batch_size=batch_size)
+
+def keyset_filter(keys, values):
+    """
+    Build a query matching the documents that sort after the given key values
+
+    :param keys: The sort keys, all ascending
+    :param values: The key values of the last seen document
+    :rtype: dict
+    """
+    clauses = []
+    for index, key in enumerate(keys):
+        clause = {keys[previous]: values[previous] for previous in range(index)}
+        clause[key] = {"$gt": values[index]}
+        clauses.append(clause)
+    return {"$or": clauses}
+
+def find_page(db, after=None, limit=0, projection=None, batch_size=0, layout=STORAGE_LAYOUT):
+    """
+    Iterate over the dog data items in (breed_name, gender, from_age, _id) order
+
+    :param db: MongoDB database
+    :param after: The PAGE_SORT_KEYS values of the last item of the previous page, None to start from the beginning
+    :param limit: The maximum number of items, 0 for no limit
+    :param projection: The fields to return, must include PAGE_SORT_KEYS for the next page to be computable
+    :param batch_size: The cursor batch size, 0 for the server default
+    :param layout: The storage layout
+    :return: Generator of dog data documents
+    """
+    if is_single_collection(layout):
+        query = keyset_filter(PAGE_SORT_KEYS, after) if after else {}
+        yield from db[DOGS_DATA_COLLECTION].find(query, projection, sort=[(key, 1) for key in PAGE_SORT_KEYS], limit=limit, batch_size=batch_size)
+        return
+
+    # The breed is the collection, so only the remaining keys are sorted on inside each collection
+    breed_sort_keys = PAGE_SORT_KEYS[1:]
+    remaining = limit
+    for breed in sorted(list_breed_names(db, layout)):
+        if after and breed < after[0]:
+            continue
+        query = keyset_filter(breed_sort_keys, after[1:]) if after and breed == after[0] else {}
+        for dog_data in db[breed].find(query, projection, sort=[(key, 1) for key in breed_sort_keys], limit=remaining, batch_size=batch_size):
+            yield dog_data
+            if limit:
+                remaining -= 1
+                if remaining == 0:
+                    return
+
+def find_by_id(db, dog_id, layout=STORAGE_LAYOUT):
+    """
+    Find a dog data item by its UUID
+
+    :param db: MongoDB database
+    :param dog_id: The UUID of the dog data
+    :param layout: The storage layout
+    :return: The dog data, or None if not found
+    :rtype: dict
+    """
+    if is_single_collection(layout):
+        return db[DOGS_DATA_COLLECTION].find_one({"_id": dog_id})
+
+    DogIdLocator.ensure_ready(db, list_breed_names)
+    breed = DogIdLocator.resolve(db, dog_id)
+    if breed is None:
+        return scan_for_id(db, dog_id, layout) if DOGS_ID_LOCATOR_FALLBACK_SCAN else None
+    dog_data = db[breed].find_one({"_id": dog_id})
+    if dog_data is None:
+        # The locator entry is stale (e.g. the record was deleted by another worker)
+        DogIdLocator.forget(db, dog_id)
+    return dog_data
+
+def scan_for_id(db, dog_id, layout=STORAGE_LAYOUT):
+    """
+    Find a dog data item missing from the ID locator by querying every breed collection
+    concurrently, stopping at the first hit, and register it in the locator
+
+    :param db: MongoDB database
+    :param dog_id: The UUID of the dog data
+    :param layout: The storage layout
+    :return: The dog data, or None if not found
+    :rtype: dict
+    """
+    def find_in_breed(breed):
+        dog_data = db[breed].find_one({"_id": dog_id})
+        return (breed, dog_data) if dog_data is not None else None
+
+    hit = fanout_executor.first_hit(find_in_breed, list_breed_names(db, layout))
+    if hit is None:
+        return None
+    breed, dog_data = hit
+    DogIdLocator.register(db, dog_id, breed)
+    return dog_data
+
+def find_breed_picture(db, breed_name, layout=STORAGE_LAYOUT):
+    """
+    Get the picture URL of the first dog data item of a breed
+
+    :param db: MongoDB database
+    :param breed_name: The name of the breed
+    :param layout: The storage layout
+    :return: The picture URL, or None if the breed has no dog data
+    :rtype: str
+    """
+    dog_data = breed_collection(db, breed_name, layout).find_one(breed_filter(breed_name, {}, layout), {"pic_url": 1})
+    return dog_data.get("pic_url") if dog_data else None
+
+def find_breed_pictures(db, layout=STORAGE_LAYOUT):
+    """
+    Get the picture URL of the first dog data item of every breed, skipping empty breeds
+
+    :param db: MongoDB database
+    :param layout: The storage layout
+    :return: Dictionary of breed name to picture URL
+    :rtype: dict
+    """
+    if is_single_collection(layout):
+        pictures = db[DOGS_DATA_COLLECTION].aggregate([
+            {"$group": {"_id": "$breed_name", "pic_url": {"$first": "$pic_url"}}}
+        ])
+        return {picture["_id"]: picture["pic_url"] for picture in pictures}
+
+    breed_names = list_breed_names(db, layout)
+    pic_urls = fanout_executor.map(lambda breed: find_breed_picture(db, breed, layout), breed_names)
+    return {breed: pic_url for breed, pic_url in zip(breed_names, pic_urls) if pic_url is not None}
+
+def prepare_insert(db, layout=STORAGE_LAYOUT):
+    """
+    Get the layout's bookkeeping ready before dog data items are inserted. An empty ID
+    locator is backfilled from the breed collections now, before it could pick up the
+    items about to be inserted.
+
+    :param db: MongoDB database
+    :param layout: The storage layout
+    """
+    if not is_single_collection(layout):
+        DogIdLocator.ensure_ready(db, list_breed_names)
+
+def record_created(db, dog_data, layout=STORAGE_LAYOUT):
+    """
+    Update the layout's bookkeeping after a dog data item was inserted, see prepare_insert
+
+    :param db: MongoDB database
+    :param dog_data: The inserted dog data
+    :param layout: The storage layout
+    """
+    if layout == STORAGE_LAYOUT and is_breed_collection(dog_data["breed_name"], layout):
+        breed_catalogue.add(dog_data["breed_name"])
+    if not is_single_collection(layout):
+        DogIdLocator.register(db, dog_data["_id"], dog_data["breed_name"])
+
+def record_created_many(db, breed_name, dog_data_items, layout=STORAGE_LAYOUT):
+    """
+    Update the layout's bookkeeping after several dog data items of a breed were inserted, see prepare_insert
+
+    :param db: MongoDB database
+    :param breed_name: The breed of the inserted dog data
+    :param dog_data_items: The inserted dog data
+    :param layout: The storage layout
+    """
+    if not dog_data_items:
+        return
+    if layout == STORAGE_LAYOUT and is_breed_collection(breed_name, layout):
+        breed_catalogue.add(breed_name)
+    if not is_single_collection(layout):
+        DogIdLocator.register_many(db, breed_name, [dog_data["_id"] for dog_data in dog_data_items])
+
+def record_deleted(db, dog_id, layout=STORAGE_LAYOUT):
+    """
+    Update the layout's bookkeeping after a dog data item was deleted
+
+    :param db: MongoDB database
+    :param dog_id: The UUID of the deleted dog data
+    :param layout: The storage layout
+    """
+    if not is_single_collection(layout):
+        DogIdLocator.forget(db, dog_id)
+
+def delete_by_id(db, dog_id, layout=STORAGE_LAYOUT):
+    """
+    Delete a dog data item by its UUID
+
+    :param db: MongoDB database
+    :param dog_id: The UUID of the dog data
+    :param layout: The storage layout
+    :return: The deleted dog data, or None if not found
+    :rtype: dict
+    """
+    if is_single_collection(layout):
+        return db[DOGS_DATA_COLLECTION].find_one_and_delete({"_id": dog_id})
+
+    DogIdLocator.ensure_ready(db, list_breed_names)
+    deleted_dog_data = DogIdLocator.delete_record(db, dog_id)
+    if deleted_dog_data is None and DOGS_ID_LOCATOR_FALLBACK_SCAN and scan_for_id(db, dog_id, layout) is not None:
+        deleted_dog_data = DogIdLocator.delete_record(db, dog_id)
+    return deleted_dog_data
+
+def delete_all(db, layout=STORAGE_LAYOUT, mode=DOGS_DELETE_ALL_MODE):
+    """
+    Delete every stored dog data item
+
+    :param db: MongoDB database
+    :param layout: The storage layout
+    :param mode: How the data is deleted, one of DELETE_ALL_MODES. In TRUNCATE_MODE the
+                 emptied breed collections are kept, so they are still listed as breeds.
+    :raises ValueError: If the mode is one of TEST_ONLY_DELETE_ALL_MODES outside a test environment
+    """
+    if mode in TEST_ONLY_DELETE_ALL_MODES and not DOGS_TEST_ENVIRONMENT:
+        raise ValueError(f"The '{mode}' delete mode is only allowed in a test environment")
+
+    if layout == STORAGE_LAYOUT:
+        # Never drop from a cached list, breeds added by other processes would survive
+        breed_catalogue.invalidate()
+
+    if mode == DROP_DATABASE_MODE:
+        db.client.drop_database(db.name)
+        DogIdLocator.reset()
+    elif is_single_collection(layout):
+        # Keep the collection and its indexes
+        db[DOGS_DATA_COLLECTION].delete_many({})
+    elif mode == TRUNCATE_MODE:
+        fanout_executor.map(lambda breed: db[breed].delete_many({}), list_breed_names(db, layout))
+        DogIdLocator.clear(db)
+    else:
+        fanout_executor.map(lambda breed: db[breed].drop(), list_breed_names(db, layout))
+        DogIdLocator.clear(db)
+
+    if mode != TRUNCATE_MODE:
+        with _indexed_breeds_lock:
+            _indexed_breeds.clear()
+    if mode == DROP_DATABASE_MODE and is_single_collection(layout):
+        ensure_indexes(db, layout)
+    if layout == STORAGE_LAYOUT and not (mode == TRUNCATE_MODE and not is_single_collection(layout)):
+        breed_catalogue.set([])
@@ -0,0 +1,43 @@
+import os
+import sys
+
+# The modules of the app live at the root of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The endpoint tests run against the in-memory backend, no database is needed.
+# The backend is read when storage_backend is imported, so it is set before the app is.
+os.environ["DOGS_STORAGE_BACKEND"] = "memory"
+
+import pytest
+
+@pytest.fixture
+def client():
+    from app import app
+    from memory_dogs_repository import memory_dogs_repository
+    from dogs_cache import breed_lookup_cache
+    from age_intervals import age_interval_index
+    from breed_catalogue import breed_catalogue
+    memory_dogs_repository.delete_all()
+    breed_lookup_cache.clear()
+    age_interval_index.clear()
+    breed_catalogue.invalidate()
+    return app.test_client()
+
+@pytest.fixture
+def dog_data():
+    def build(breed_name="Labrador", gender="Male", from_age=0, to_age=1, **fields):
+        return {
+            "breed_name": breed_name,
+            "gender": gender,
+            "from_age": from_age,
+            "to_age": to_age,
+            "avg_height_min": 50,
+            "avg_height_max": 60,
+            "avg_weight_min": 20,
+            "avg_weight_max": 30,
+            "avg_drink": 1.5,
+            "avg_food": 0.5,
+            "pic_url": f"https://example.com/{breed_name}.jpg",
+            **fields
+        }
+    return build
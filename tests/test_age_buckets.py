@@ -0,0 +1,117 @@
+from age_intervals import AgeBuckets, AgeIntervalIndex
+import pytest
+
+def dog_data(from_age, to_age):
+    return {"from_age": from_age, "to_age": to_age}
+
+def age_range(found):
+    return None if found is None else (found['from_age'], found['to_age'])
+
+# Touching buckets, a zero-width bucket between them and a gap after them
+DISJOINT = [dog_data(2, 4), dog_data(0, 1), dog_data(1, 1), dog_data(1, 2), dog_data(6, 8)]
+# (0, 3) overlaps (1, 2) and (2, 4)
+NON_DISJOINT = [dog_data(0, 3), dog_data(1, 2), dog_data(2, 4), dog_data(6, 8)]
+
+def linear_find_containing(items, age):
+    ordered = sorted(items, key=lambda item: (item['from_age'], item['to_age']))
+    return next((item for item in ordered if item['from_age'] <= age <= item['to_age']), None)
+
+def overlaps(item, from_age, to_age):
+    return item['from_age'] < to_age and item['to_age'] > from_age
+
+def test_sorts_items_and_detects_disjoint_data():
+    buckets = AgeBuckets(DISJOINT)
+    assert [age_range(item) for item in buckets.items] == [(0, 1), (1, 1), (1, 2), (2, 4), (6, 8)]
+    assert buckets.disjoint
+    assert not AgeBuckets(NON_DISJOINT).disjoint
+    assert AgeBuckets([]).disjoint
+
+@pytest.mark.parametrize("age, expected", [
+    (-1, None),
+    (0, (0, 1)),
+    (0.5, (0, 1)),
+    # Ages on a boundary belong to the lowest bucket containing them
+    (1, (0, 1)),
+    (1.5, (1, 2)),
+    (2, (1, 2)),
+    (4, (2, 4)),
+    (5, None),
+    (8, (6, 8)),
+    (9, None),
+])
+def test_find_containing(age, expected):
+    assert age_range(AgeBuckets(DISJOINT).find_containing(age)) == expected
+
+@pytest.mark.parametrize("items", [DISJOINT, NON_DISJOINT])
+def test_find_containing_matches_a_linear_scan(items):
+    buckets = AgeBuckets(items)
+    for tenths in range(-10, 100):
+        age = tenths / 10
+        assert buckets.find_containing(age) == linear_find_containing(items, age), age
+
+@pytest.mark.parametrize("from_age, to_age, expected", [
+    (0, 1, (0, 1)),
+    # The zero-width bucket shares its to_age with the bucket touching it from below
+    (1, 1, (1, 1)),
+    (1, 2, (1, 2)),
+    (2, 4, (2, 4)),
+    (0, 2, None),
+    (2, 2, None),
+    (6, 7, None),
+])
+def test_find_exact(from_age, to_age, expected):
+    assert age_range(AgeBuckets(DISJOINT).find_exact(from_age, to_age)) == expected
+
+def test_find_exact_on_non_disjoint_data():
+    buckets = AgeBuckets(NON_DISJOINT)
+    assert age_range(buckets.find_exact(1, 2)) == (1, 2)
+    assert age_range(buckets.find_exact(0, 3)) == (0, 3)
+    assert buckets.find_exact(0, 2) is None
+
+@pytest.mark.parametrize("from_age, to_age, expected", [
+    # Touching ranges do not overlap
+    (4, 6, None),
+    (8, 9, None),
+    (-1, 0, None),
+    (4.5, 5.5, None),
+    (3, 5, (2, 4)),
+    (5, 7, (6, 8)),
+    (0.5, 1.5, (0, 1)),
+    # A zero-width range overlaps the bucket strictly containing it, not the buckets it touches
+    (3, 3, (2, 4)),
+    (1, 1, None),
+    (5, 5, None),
+    (-2, 10, (0, 1)),
+])
+def test_find_overlapping(from_age, to_age, expected):
+    assert age_range(AgeBuckets(DISJOINT).find_overlapping(from_age, to_age)) == expected
+
+@pytest.mark.parametrize("items", [DISJOINT, NON_DISJOINT])
+def test_find_overlapping_matches_a_linear_scan(items):
+    buckets = AgeBuckets(items)
+    ages = [age / 2 for age in range(-2, 20)]
+    for from_age in ages:
+        for to_age in ages:
+            if to_age < from_age:
+                continue
+            found = buckets.find_overlapping(from_age, to_age)
+            if any(overlaps(item, from_age, to_age) for item in items):
+                assert found is not None and overlaps(found, from_age, to_age), (from_age, to_age)
+            else:
+                assert found is None, (from_age, to_age)
+
+def test_index_evicts_the_least_recently_used_buckets():
+    index = AgeIntervalIndex(max_size=2)
+    index.load("Labrador", "Male", [dog_data(0, 1)])
+    index.load("Labrador", "Female", [])
+    assert index.get("Labrador", "Male") is not None
+    index.load("Poodle", "Male", [])
+    assert index.size() == 2
+    assert index.get("Labrador", "Female") is None
+    assert index.get("Labrador", "Male") is not None
+
+def test_index_drops_expired_buckets():
+    index = AgeIntervalIndex(ttl_seconds=0)
+    index.load("Labrador", "Male", [dog_data(0, 1)])
+    assert index.get("Labrador", "Male") is None
+    assert index.size() == 0
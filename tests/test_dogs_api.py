@@ -0,0 +1,152 @@
+import controllers.dogs_server
+
+UPDATES = {"avg_height_min": 55, "avg_height_max": 65, "avg_weight_min": 25, "avg_weight_max": 35, "avg_food": 0.75}
+
+def create(client, dog_data, **fields):
+    response = client.post("/dogs_data", json=dog_data(**fields))
+    assert response.status_code == 201, response.json
+    return response.json["_id"]
+
+def test_create_and_get(client, dog_data):
+    dog_id = create(client, dog_data)
+    assert client.get(f"/dogs_data/{dog_id}").json["breed_name"] == "Labrador"
+    assert client.get("/dogs_data/Labrador/Male/0.5").json["_id"] == dog_id
+    assert client.get("/dogs_data/Labrador/Male/0/1").json["_id"] == dog_id
+    assert client.get("/dogs_data/Labrador/Female/0.5").status_code == 404
+    assert client.get("/dogs_data/breeds").json == ["Labrador"]
+
+def test_create_rejects_invalid_dog_data(client, dog_data):
+    assert client.post("/dogs_data", json={"breed_name": "Labrador"}).status_code == 400
+    assert client.post("/dogs_data", json=dog_data(from_age="old")).status_code == 400
+    assert client.post("/dogs_data", json=dog_data(gender="Other")).status_code == 400
+    assert client.post("/dogs_data", json=dog_data(from_age=2, to_age=1)).status_code == 400
+    assert client.post("/dogs_data", json=dog_data(breed_name=["Labrador"])).status_code == 400
+    assert client.post("/dogs_data", json=dog_data(breed_name="_dogs_id_locator")).status_code == 400
+
+def test_create_rejects_overlapping_age_ranges(client, dog_data):
+    create(client, dog_data, from_age=0, to_age=2)
+    assert client.post("/dogs_data", json=dog_data(from_age=1, to_age=3)).status_code == 400
+    # Touching ranges do not overlap
+    create(client, dog_data, from_age=2, to_age=3)
+
+def test_bulk_create(client, dog_data):
+    response = client.post("/dogs_data/bulk", json=[dog_data(from_age=0, to_age=1), dog_data(from_age=1, to_age=2)])
+    assert response.status_code == 201
+    assert response.json["succeeded"] == 2
+
+    response = client.post("/dogs_data/bulk", json=[dog_data(from_age=2, to_age=3), dog_data(from_age=0.5, to_age=1.5), dog_data(from_age=2.5, to_age=4), {}])
+    assert response.status_code == 207
+    assert [result["status"] for result in response.json["results"]] == [201, 400, 400, 400]
+
+    response = client.post("/dogs_data/bulk", json=[dog_data(from_age=0, to_age=1)])
+    assert response.status_code == 400
+
+def test_bulk_create_accepts_ndjson(client, dog_data):
+    import json
+    body = "\n".join(json.dumps(dog_data(from_age=age, to_age=age + 1)) for age in range(3))
+    response = client.post("/dogs_data/bulk", data=body, content_type="application/x-ndjson")
+    assert response.status_code == 201
+    assert len(client.get("/dogs_data/all").json) == 3
+
+def test_bulk_update(client, dog_data):
+    create(client, dog_data, from_age=0, to_age=1)
+    create(client, dog_data, from_age=1, to_age=2)
+    response = client.patch("/dogs_data/bulk", json=[
+        {"breed_name": "Labrador", "gender": "Male", "from_age": 0, "to_age": 1, "return_document": True, **UPDATES},
+        {"breed_name": "Labrador", "gender": "Male", "from_age": 5, "to_age": 6, **UPDATES},
+        {"breed_name": "Labrador", "gender": "Male", "from_age": 1, "to_age": 2, **UPDATES},
+        {"breed_name": ["Labrador"], "gender": "Male", "from_age": 1, "to_age": 2, **UPDATES}
+    ])
+    assert response.status_code == 207
+    assert [result["status"] for result in response.json["results"]] == [200, 404, 200, 400]
+    assert response.json["results"][0]["dog_data"]["avg_food"] == 0.75
+    assert client.get("/dogs_data/Labrador/Male/1.5").json["avg_food"] == 0.75
+
+def test_lookup(client, dog_data):
+    create(client, dog_data, from_age=0, to_age=1)
+    create(client, dog_data, breed_name="Poodle", gender="Female", from_age=0, to_age=5)
+    response = client.post("/dogs_data/lookup", json=[
+        {"breed_name": "Labrador", "gender": "Male", "age": 0.5},
+        {"breed_name": "Poodle", "gender": "Female", "age": 3},
+        {"breed_name": "Labrador", "gender": "Male", "age": 3},
+        {"breed_name": ["Labrador"], "gender": "Male", "age": 0.5}
+    ])
+    assert response.status_code == 200
+    assert response.json["found"] == 2
+    assert [result["status"] for result in response.json["results"]] == [200, 200, 404, 400]
+
+def test_list_pages_with_cursors_and_fields(client, dog_data):
+    for age in range(5):
+        create(client, dog_data, from_age=age, to_age=age + 1)
+    ages = []
+    cursor = None
+    while True:
+        response = client.get("/dogs_data/all", query_string={"limit": 2, "fields": "from_age", **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        assert all(set(item) == {"from_age"} for item in response.json)
+        ages += [item["from_age"] for item in response.json]
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert ages == [0, 1, 2, 3, 4]
+
+def test_list_rejects_invalid_arguments(client):
+    assert client.get("/dogs_data/all?limit=-1").status_code == 400
+    assert client.get("/dogs_data/all?fields=unknown").status_code == 400
+    assert client.get("/dogs_data/all?cursor=nope").status_code == 400
+    # A cursor whose values are not plain strings and numbers
+    assert client.get("/dogs_data/all?cursor=W3siJG5lIjogMX0sICJNYWxlIiwgMCwgIngiXQ==").status_code == 400
+
+def test_stream_all(client, dog_data):
+    create(client, dog_data)
+    response = client.get("/dogs_data/all?stream=true")
+    assert response.status_code == 200
+    assert [item["breed_name"] for item in response.json] == ["Labrador"]
+
+def test_conditional_get(client, dog_data):
+    dog_id = create(client, dog_data)
+    for url in [f"/dogs_data/{dog_id}", "/dogs_data/Labrador/Male/0.5", "/dogs_data/all", "/dogs_data/breeds"]:
+        response = client.get(url)
+        assert response.headers["ETag"], url
+        not_modified = client.get(url, headers={"If-None-Match": response.headers["ETag"]})
+        assert not_modified.status_code == 304, url
+        assert not_modified.headers["ETag"] == response.headers["ETag"]
+
+    response = client.get(f"/dogs_data/{dog_id}")
+    assert client.get(f"/dogs_data/{dog_id}", headers={"If-Modified-Since": response.headers["Last-Modified"]}).status_code == 304
+    assert "Last-Modified" not in client.get("/dogs_data/all").headers
+
+def test_writes_invalidate_the_caches(client, dog_data):
+    create(client, dog_data)
+    response = client.get("/dogs_data/Labrador/Male/0.5")
+    assert client.get("/dogs_data/Labrador/Male/0.5").json == response.json
+    assert client.get("/dogs_data/cache/stats").json["hits"] >= 1
+
+    assert client.put("/dogs_data/Labrador/Male/0/1", json=UPDATES).status_code == 200
+    updated = client.get("/dogs_data/Labrador/Male/0.5", headers={"If-None-Match": response.headers["ETag"]})
+    assert updated.status_code == 200
+    assert updated.json["avg_food"] == 0.75
+
+    assert client.delete("/dogs_data/Labrador/Male/0/1").status_code == 200
+    assert client.get("/dogs_data/Labrador/Male/0.5").status_code == 404
+
+def test_delete(client, dog_data):
+    dog_id = create(client, dog_data)
+    assert client.delete(f"/dogs_data/{dog_id}").status_code == 200
+    assert client.get(f"/dogs_data/{dog_id}").status_code == 404
+    create(client, dog_data)
+    assert client.delete("/dogs_data").status_code == 200
+    assert client.get("/dogs_data/all").json == []
+
+def test_read_only_backend_rejects_writes(client, dog_data, monkeypatch):
+    monkeypatch.setattr(controllers.dogs_server, "is_read_only_backend", lambda: True)
+    response = client.post("/dogs_data", json=dog_data())
+    assert response.status_code == 405
+    assert response.headers["Allow"] == "OPTIONS"
+    response = client.put("/dogs_data/Labrador/Male/0/1", json=UPDATES)
+    assert response.status_code == 405
+    assert set(response.headers["Allow"].split(", ")) == {"GET", "HEAD", "OPTIONS"}
+    assert client.delete("/dogs_data").status_code == 405
+    assert client.get("/dogs_data/all").status_code == 200
+    assert client.head("/dogs_data/all").status_code == 200
+    assert client.post("/dogs_data/lookup", json=[]).status_code == 200
@@ -0,0 +1,22 @@
+from controllers.dogs_common import group_lookups
+
+def test_groups_valid_lookups_by_breed():
+    results, lookups_by_breed = group_lookups([
+        {"breed_name": "Labrador", "gender": "Male", "age": 1},
+        {"breed_name": "Poodle", "gender": "Female", "age": "2.345"},
+        {"breed_name": "Labrador", "gender": "Female", "age": 3}
+    ])
+    assert results == [None, None, None]
+    assert lookups_by_breed == {"Labrador": [(0, "Male", 1.0), (2, "Female", 3.0)], "Poodle": [(1, "Female", 2.35)]}
+
+def test_invalid_lookups_are_rejected_per_item():
+    results, lookups_by_breed = group_lookups([
+        {"breed_name": ["Labrador"], "gender": "Male", "age": 1},
+        {"breed_name": "Labrador", "gender": {"$ne": "Male"}, "age": 1},
+        {"breed_name": "Labrador", "gender": "Male", "age": "old"},
+        {"breed_name": "Labrador", "gender": "Male"},
+        "Labrador",
+        {"breed_name": "Labrador", "gender": "Male", "age": 1}
+    ])
+    assert [result and result["status"] for result in results] == [400, 400, 400, 400, 400, None]
+    assert lookups_by_breed == {"Labrador": [(5, "Male", 1.0)]}
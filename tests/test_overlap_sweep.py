@@ -0,0 +1,69 @@
+from controllers.dogs_common import sweep_overlapping_items
+
+def dog_data(from_age, to_age, gender='Male'):
+    return {"breed_name": "Labrador", "gender": gender, "from_age": from_age, "to_age": to_age}
+
+def sweep(items, existing_items=()):
+    to_insert, rejected = sweep_overlapping_items(list(enumerate(items)), list(existing_items))
+    return sorted(index for index, _ in to_insert), rejected
+
+def test_accepts_touching_ranges():
+    inserted, rejected = sweep([dog_data(2, 3), dog_data(0, 1), dog_data(1, 2)])
+    assert inserted == [0, 1, 2]
+    assert rejected == {}
+
+def test_rejects_ranges_overlapping_within_the_request():
+    inserted, rejected = sweep([dog_data(0, 2), dog_data(1, 3), dog_data(3, 4)])
+    assert inserted == [0, 2]
+    assert rejected == {1: "Overlapping age range within the request"}
+
+def test_compares_with_the_furthest_end_accepted():
+    # (1, 2) ends before (0, 5) but still overlaps it, and so does (4, 6)
+    inserted, rejected = sweep([dog_data(0, 5), dog_data(1, 2), dog_data(4, 6), dog_data(5, 6)])
+    assert inserted == [0, 3]
+    assert set(rejected) == {1, 2}
+
+def test_rejected_items_do_not_block_later_items():
+    # (0, 3) is rejected by the existing data, so (2, 4) no longer overlaps an accepted item
+    inserted, rejected = sweep([dog_data(0, 3), dog_data(2, 4)], [dog_data(0, 1)])
+    assert inserted == [1]
+    assert rejected == {0: "Overlapping age range exists for this breed"}
+
+def test_the_first_item_in_age_order_wins_then_the_lowest_index():
+    inserted, rejected = sweep([dog_data(1, 3), dog_data(0, 2), dog_data(0, 2)])
+    assert inserted == [1]
+    assert set(rejected) == {0, 2}
+
+def test_zero_width_ranges():
+    # A zero-width range overlaps the ranges strictly containing it but not those it touches
+    inserted, rejected = sweep([dog_data(1, 1), dog_data(0, 1), dog_data(1, 2), dog_data(1, 1)])
+    assert inserted == [0, 1, 2, 3]
+    assert rejected == {}
+    inserted, rejected = sweep([dog_data(0, 2), dog_data(1, 1)])
+    assert inserted == [0]
+    assert rejected == {1: "Overlapping age range within the request"}
+
+def test_genders_are_swept_separately():
+    inserted, rejected = sweep([dog_data(0, 2, 'Male'), dog_data(1, 3, 'Female'), dog_data(1, 3, 'Male')])
+    assert inserted == [0, 1]
+    assert set(rejected) == {2}
+
+def test_rejects_ranges_overlapping_existing_data():
+    existing_items = [dog_data(2, 4), dog_data(0, 10, 'Female')]
+    inserted, rejected = sweep([dog_data(0, 2), dog_data(3, 5), dog_data(4, 6), dog_data(0, 1, 'Female')], existing_items)
+    assert inserted == [0, 2]
+    assert rejected == {1: "Overlapping age range exists for this breed", 3: "Overlapping age range exists for this breed"}
+
+def test_matches_pairwise_overlap_checks():
+    ages = [age / 2 for age in range(0, 8)]
+    ranges = [(from_age, to_age) for from_age in ages for to_age in ages if to_age >= from_age]
+    items = [dog_data(from_age, to_age) for from_age, to_age in ranges]
+    to_insert, rejected = sweep_overlapping_items(list(enumerate(items)), [])
+    accepted = [dog_data_item for _, dog_data_item in to_insert]
+    # No two accepted items overlap and every rejected item overlaps an accepted one
+    for i, first in enumerate(accepted):
+        for second in accepted[i + 1:]:
+            assert not (first['from_age'] < second['to_age'] and first['to_age'] > second['from_age']), (first, second)
+    for index in rejected:
+        item = items[index]
+        assert any(other['from_age'] < item['to_age'] and other['to_age'] > item['from_age'] for other in accepted), item